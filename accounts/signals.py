@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from core.authentication import invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Profile edits, (de)activation and deletion reach the auth cache at once."""
+    invalidate_user(instance.pk)
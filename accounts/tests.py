@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from django.db import connection
 from django.test import TestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -96,3 +99,90 @@ class UserProfileAPITest(TestCase):
         url = reverse('accounts:profile')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=60)
+class CachedUserAuthenticationTest(TestCase):
+    """Authenticated requests resolve the user from a short-lived cache"""
+
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(
+            email='cached@example.com', password='cachedpass', first_name='Cached',
+        )
+        self.admin = User.objects.create_superuser(email='root@example.com', password='rootpass')
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+        self.admin_client = APIClient()
+        self.admin_client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}'
+        )
+
+    def _user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q for q in ctx.captured_queries if 'FROM "users"' in q['sql']]
+
+    def test_repeat_requests_skip_user_query(self):
+        """Only the first request with a token loads the user row"""
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(len(self._user_queries()), 0)
+
+    def test_cached_user_is_bound_to_read_database(self):
+        """A user rebuilt from the cache belongs to the database it was read from"""
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from core.authentication import CachedUserJWTAuthentication
+
+        auth = CachedUserJWTAuthentication()
+        token = AccessToken.for_user(self.user)
+        auth.get_user(token)
+        with self.assertNumQueries(0):
+            user = auth.get_user(token)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'cached@example.com')
+        self.assertEqual(user._state.db, 'default')
+
+    def test_entry_with_other_fields_is_a_miss(self):
+        """An entry cached for a different set of user fields is reloaded"""
+        from django.core.cache import cache
+
+        from core.authentication import USER_KEY
+        from core.authentication import _user_version
+
+        self.client.get(reverse('accounts:profile'))
+        key = USER_KEY.format(pk=self.user.pk, version=_user_version(self.user.pk))
+        stale = dict(cache.get(key))
+        stale.pop('first_name')
+        cache.set(key, stale)
+
+        self.assertEqual(len(self._user_queries()), 1)
+        self.assertEqual(len(self._user_queries()), 0)
+
+    def test_profile_change_invalidates_cache(self):
+        """A profile edit is visible on the next request"""
+        self.client.get(reverse('accounts:profile'))
+        self.client.patch(reverse('accounts:profile'), {'first_name': 'Renamed'}, format='json')
+
+        response = self.client.get(reverse('accounts:profile'))
+
+        self.assertEqual(response.data['first_name'], 'Renamed')
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('cachedpass'))
+
+    def test_deactivation_and_reactivation_invalidate_cache(self):
+        """A deactivated user is rejected at once and accepted again after reactivation"""
+        self.client.get(reverse('accounts:profile'))
+        url = reverse('users:admin-user-deactivate', args=[self.user.pk])
+
+        self.assertEqual(self.admin_client.post(url, {}, format='json').status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertEqual(self.admin_client.patch(url, {}, format='json').status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('accounts:profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
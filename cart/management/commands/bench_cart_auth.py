@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db import transaction
+from django.test import Client
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from cart.services.cart_service import CartService
+from cart.views import CartBaseView
+from core.constants import CartOperation
+from products.models import Category
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = _('Compare cart request cost with duplicate and shared JWT authentication')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help=_('Requests per endpoint and mode'))
+
+    def handle(self, *args, **options):
+        # Everything the benchmark creates is rolled back at the end. The
+        # user cache is off so each request really resolves its user.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], AUTH_USER_CACHE_TIMEOUT=0):
+            self.user = get_user_model().objects.create_user(
+                email='bench-cart-auth@example.com', password='bench-cart-auth',
+            )
+            category = Category.objects.create(name='Bench cart auth')
+            self.product = Product.objects.create(name='Bench product', price=1, category=category)
+            self.client = Client(
+                HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}',
+            )
+
+            line = {'product_id': self.product.id, 'quantity': 1}
+            endpoints = [
+                ('add', 'api_add_to_cart', line),
+                ('get', 'api_get_cart', None),
+                ('summary', 'api_get_cart_summary', None),
+                ('update', 'api_update_cart_item', line),
+                ('remove', 'api_remove_from_cart', {'product_id': self.product.id}),
+                ('clear', 'api_clear_cart', {}),
+            ]
+
+            self.stdout.write(f"{'endpoint':<10}{'before ms':>11}{'after ms':>10}{'saved':>8}{'user queries':>15}")
+            for name, url_name, data in endpoints:
+                url = reverse(url_name)
+                # The old setup: DRF verifies the token again after the decorator.
+                with mock.patch.object(CartBaseView, 'authentication_classes', [JWTAuthentication]):
+                    before, before_queries = self._measure(url, data, options['requests'])
+                after, after_queries = self._measure(url, data, options['requests'])
+                self.stdout.write(
+                    f"{name:<10}{before:>11.3f}{after:>10.3f}{(before - after) / before:>8.0%}"
+                    f"{f'{before_queries} -> {after_queries}':>15}"
+                )
+            transaction.set_rollback(True)
+
+    def _reset_cart(self):
+        """One line of the bench product, so every endpoint takes its success path."""
+        _cart, items = CartService.read(self.user)
+        operations = [{"op": CartOperation.CLEAR.value}] if items else []
+        operations.append({"op": CartOperation.ADD.value, "product_id": self.product.id, "quantity": 1})
+        CartService.apply(self.user, operations)
+
+    def _request(self, url, data):
+        if data is None:
+            return self.client.get(url)
+        return self.client.post(url, data, content_type='application/json')
+
+    def _measure(self, url, data, requests):
+        """Average milliseconds per request, and ``users`` queries of one request."""
+        elapsed = 0.0
+        for _i in range(requests):
+            self._reset_cart()
+            start = time.perf_counter()
+            self._request(url, data)
+            elapsed += time.perf_counter() - start
+
+        self._reset_cart()
+        with CaptureQueriesContext(connection) as ctx:
+            self._request(url, data)
+        user_queries = len([q for q in ctx.captured_queries if 'FROM "users"' in q['sql']])
+        return elapsed * 1000 / requests, user_queries
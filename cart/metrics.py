@@ -0,0 +1,32 @@
+"""Contention counters for cart writes, shared through the Django cache."""
+from __future__ import annotations
+
+from django.core.cache import cache
+
+CAS_RETRIES_KEY = 'metrics:cart:cas_retries'
+CAS_CONFLICTS_KEY = 'metrics:cart:cas_conflicts'
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def record_retry():
+    """A version compare-and-swap lost to a concurrent write and was retried."""
+    _increment(CAS_RETRIES_KEY)
+
+
+def record_conflict():
+    """A write gave up: the client's version was stale or retries ran out."""
+    _increment(CAS_CONFLICTS_KEY)
+
+
+def snapshot():
+    return {
+        'cas_retries': cache.get(CAS_RETRIES_KEY, 0),
+        'cas_conflicts': cache.get(CAS_CONFLICTS_KEY, 0),
+    }
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:10
+from __future__ import annotations
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('products', '0011_product_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='cart',
+            old_name='items',
+            new_name='legacy_items',
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('name', models.CharField(max_length=255)),
+                ('image', models.TextField(blank=True, null=True)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='cart.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='products.product')),
+            ],
+            options={
+                'db_table': 'cart_items',
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('cart', 'product'), name='uniq_cart_items_cart_product')],
+            },
+        ),
+    ]
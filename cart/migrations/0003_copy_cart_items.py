@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:12
+from __future__ import annotations
+
+from decimal import Decimal
+from decimal import InvalidOperation
+
+from django.db import migrations
+
+
+def copy_json_items(apps, schema_editor):
+    """Move every JSON cart line into cart_items, merging duplicates."""
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    Product = apps.get_model('products', 'Product')
+
+    existing_products = set(Product.objects.values_list('id', flat=True))
+    lines = {}
+    for cart_id, items in Cart.objects.values_list('id', 'legacy_items').iterator():
+        for item in items or []:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity') or 1)
+                price = Decimal(str(item.get('price') or '0'))
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                continue
+            if product_id not in existing_products or quantity < 1:
+                continue
+            key = (cart_id, product_id)
+            if key in lines:
+                lines[key].quantity += quantity
+                continue
+            lines[key] = CartItem(
+                cart_id=cart_id,
+                product_id=product_id,
+                quantity=quantity,
+                price=price,
+                name=(item.get('name') or '')[:255],
+                image=item.get('image'),
+            )
+    CartItem.objects.bulk_create(lines.values(), batch_size=1000)
+
+
+def copy_rows_back(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    items_by_cart = {}
+    for line in CartItem.objects.order_by('id').iterator():
+        items_by_cart.setdefault(line.cart_id, []).append({
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'price': str(line.price),
+            'name': line.name,
+            'image': line.image,
+        })
+    for cart_id, items in items_by_cart.items():
+        Cart.objects.filter(pk=cart_id).update(legacy_items=items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cartitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_json_items, copy_rows_back),
+    ]
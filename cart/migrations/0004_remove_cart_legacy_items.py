@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 19:12
+from __future__ import annotations
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_copy_cart_items'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='legacy_items',
+        ),
+    ]
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
 
+from core.constants import DecimalSettings
+from core.constants import FieldLengths
 from core.models import BaseModel
 
 
@@ -13,7 +17,14 @@ class Cart(BaseModel):
         related_name='cart',
         null=False
     )
-    items = models.JSONField(default=list)
+    # Aggregates over the lines, kept in step by every cart mutation
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(
+        max_digits=DecimalSettings.PRICE_MAX_DIGITS,
+        decimal_places=DecimalSettings.PRICE_DECIMAL_PLACES,
+        default=Decimal('0.00'),
+    )
+    version = models.PositiveIntegerField(default=0)
 
     class Meta:
         db_table = 'carts'
@@ -22,7 +33,80 @@ class Cart(BaseModel):
         return f"Cart for {self.user.email}"
 
     def get_item_count(self):
-        return len(self.items)
+        return self.item_count
 
     def get_total(self):
-        return sum(float(item['price']) * item['quantity'] for item in self.items)
+        return self.subtotal
+
+    def record_change(self, count_delta=0, subtotal_delta=Decimal('0.00')):
+        """
+        Shift the stored aggregates after a line change and bump the
+        version. Callers hold the cart row lock and run this in the same
+        transaction as the line write.
+        """
+        self.item_count += count_delta
+        self.subtotal += subtotal_delta
+        self.version += 1
+        self.save(update_fields=['item_count', 'subtotal', 'version', 'updated_at'])
+
+    def get_summary(self):
+        return {
+            "cart_item_count": self.item_count,
+            "cart_total": self.subtotal,
+        }
+
+
+class CartItem(BaseModel):
+    """One product line of a cart, with the price and name seen when added."""
+    # Both lookups are served by the indexes declared in Meta, so the
+    # implicit single-column foreign key indexes are not created.
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name='items',
+        db_index=False,
+    )
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='cart_items',
+        db_index=False,
+    )
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(
+        max_digits=DecimalSettings.PRICE_MAX_DIGITS,
+        decimal_places=DecimalSettings.PRICE_DECIMAL_PLACES,
+    )
+    name = models.CharField(max_length=FieldLengths.DEFAULT)
+    image = models.TextField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'cart_items'
+        ordering = ['id']
+        indexes = [
+            # "Is this product in any cart?" (product deletion)
+            models.Index(fields=['product'], name='idx_cart_items_product_id'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'],
+                name='uniq_cart_items_cart_product',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.name}"
+
+    @property
+    def line_total(self):
+        return self.price * self.quantity
+
+    def to_dict(self):
+        """The line in the shape the cart API has always returned."""
+        return {
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "price": str(self.price),
+            "name": self.name,
+            "image": self.image,
+        }
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.utils.translation import gettext as _
-from core.constants import CartSettings
+from core.constants import CartOperation, CartSettings
 
 class CartItemSerializer(serializers.Serializer):
     product_id = serializers.IntegerField(min_value=1)
@@ -23,3 +23,24 @@ class UpdateCartItemSerializer(serializers.Serializer):
 
 class RemoveFromCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField(min_value=1)
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=CartOperation.choices())
+    product_id = serializers.IntegerField(min_value=1, required=False)
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if attrs['op'] != CartOperation.CLEAR.value and 'product_id' not in attrs:
+            raise serializers.ValidationError({'product_id': _('This field is required.')})
+        if attrs['op'] == CartOperation.SET.value and 'quantity' not in attrs:
+            raise serializers.ValidationError({'quantity': _('This field is required.')})
+        if attrs['op'] == CartOperation.ADD.value:
+            attrs.setdefault('quantity', 1)
+        return attrs
+
+class BatchCartSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=CartSettings.MAX_BATCH_OPERATIONS,
+    )
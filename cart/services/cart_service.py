@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from cart import metrics
+from cart.models import Cart
+from cart.models import CartItem
+from cart.store import CartState
+from cart.store import get_cart_store
+from core.constants import CartOperation, CartSettings
+from products.models import Product
+from products.pricing import FlashSalePriceResolver
+
+logger = logging.getLogger(__name__)
+
+
+class CartOperationError(Exception):
+    """An operation could not be applied; nothing was written."""
+
+    def __init__(self, index, message, not_found=False):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+        self.not_found = not_found
+
+
+class CartVersionConflict(Exception):
+    """
+    The cart is not at the version the write was planned against: the
+    client's If-Match version is stale, or retries ran out.
+    """
+
+    def __init__(self, cart, exhausted=False):
+        super().__init__(cart.version)
+        self.cart = cart
+        self.exhausted = exhausted
+
+
+class CartChanges:
+    """The outcome of planning operations against a snapshot of the lines"""
+
+    def __init__(self, lines, created, updated, removed):
+        self.lines = lines
+        self.created = created
+        self.updated = updated
+        self.removed = removed
+        self.item_count = len(lines)
+        self.subtotal = sum((item.line_total for item in lines), Decimal('0.00'))
+
+
+class CartService:
+    """
+    Cart writes with optimistic concurrency.
+
+    A write reads the cart and its lines without locks, plans the change
+    in memory, then claims the cart with a compare-and-swap on
+    ``Cart.version``. Only the winner of the swap writes lines; a loser
+    re-reads and tries again, up to ``CartSettings.MAX_WRITE_RETRIES``.
+
+    With a hot cart store configured (see cart.store) the same protocol
+    runs against the store, and ``flush`` writes carts behind to Postgres.
+    """
+
+    @staticmethod
+    def apply(user, operations, expected_version=None, create=True):
+        """
+        Apply ``operations`` to the user's cart and return ``(cart, lines)``.
+
+        ``expected_version`` is the client's If-Match version: when given,
+        the write fails with CartVersionConflict instead of retrying
+        against a newer cart. With ``create=False`` a missing cart raises
+        Cart.DoesNotExist.
+        """
+        for attempt in range(CartSettings.MAX_WRITE_RETRIES + 1):
+            cart, items = CartService.read(user, create=create)
+            if expected_version is not None and cart.version != expected_version:
+                metrics.record_conflict()
+                raise CartVersionConflict(cart)
+
+            changes = CartService.plan(cart, items, operations)
+            if CartService._write(cart, changes):
+                return cart, changes.lines
+
+            if expected_version is not None:
+                metrics.record_conflict()
+                raise CartVersionConflict(cart)
+            metrics.record_retry()
+            logger.info("Cart %s changed concurrently, retry %s", cart.pk, attempt + 1)
+
+        metrics.record_conflict()
+        raise CartVersionConflict(cart, exhausted=True)
+
+    @staticmethod
+    def refresh(user):
+        """
+        Reprice the user's cart against the catalog and return ``(cart,
+        lines, report)``, ``report`` mapping product id to the line's
+        price and stock deltas. Lines whose price, name or image changed
+        are written back with the usual version swap. A missing cart
+        raises Cart.DoesNotExist.
+        """
+        for attempt in range(CartSettings.MAX_WRITE_RETRIES + 1):
+            cart, items = CartService.read(user, create=False)
+            report, changes = CartService.reprice(cart, items)
+            if changes is None or CartService._write(cart, changes):
+                return cart, items, report
+            metrics.record_retry()
+            logger.info("Cart %s changed concurrently, retry %s", cart.pk, attempt + 1)
+
+        metrics.record_conflict()
+        raise CartVersionConflict(cart, exhausted=True)
+
+    @staticmethod
+    def reprice(cart, items):
+        """
+        Compare ``items`` with current products and flash sales, using one
+        product query and one flash-sale query. Returns the per-line
+        report and the CartChanges to write, or ``None`` if nothing changed.
+        Stock counts only limit a line with STOCK_RESERVATION_ENABLED;
+        otherwise ``is_in_stock`` alone decides the shortfall.
+        """
+        products = Product.objects.in_bulk([item.product_id for item in items])
+        resolver = FlashSalePriceResolver()
+        resolver.load(products.values())
+
+        report = {}
+        updated = []
+        for item in items:
+            product = products.get(item.product_id)
+            if product is None or product.is_deleted:
+                report[item.product_id] = {
+                    "available": False,
+                    "previous_price": str(item.price),
+                    "price_delta": "0.00",
+                    "effective_price": str(item.price),
+                    "sale_price": None,
+                    "is_in_stock": False,
+                    "stock_quantity": 0,
+                    "stock_shortfall": item.quantity,
+                }
+                continue
+
+            previous_price = item.price
+            sale_price = resolver.get_sale_price(product)
+            if not product.is_in_stock:
+                shortfall = item.quantity
+            elif settings.STOCK_RESERVATION_ENABLED:
+                shortfall = max(item.quantity - product.stock_quantity, 0)
+            else:
+                # stock_quantity is only maintained once reservation is on.
+                shortfall = 0
+            report[item.product_id] = {
+                "available": True,
+                "previous_price": str(previous_price),
+                "price_delta": str(product.price - previous_price),
+                "effective_price": str(resolver.get_effective_price(product)),
+                "sale_price": str(sale_price) if sale_price is not None else None,
+                "is_in_stock": product.is_in_stock,
+                "stock_quantity": product.stock_quantity,
+                "stock_shortfall": shortfall,
+            }
+            snapshot = (product.price, product.name, product.first_image_url)
+            if (item.price, item.name, item.image) != snapshot:
+                item.price, item.name, item.image = snapshot
+                updated.append(item)
+
+        if not updated:
+            return report, None
+        return report, CartChanges(items, [], updated, [])
+
+    @staticmethod
+    def read(user, create=True):
+        """
+        The user's cart and its lines, from the hot store when there is
+        one. With ``create=False`` a missing cart raises Cart.DoesNotExist.
+        """
+        store = get_cart_store()
+        if store is None:
+            if create:
+                cart, _created = Cart.objects.get_or_create(user=user)
+            else:
+                cart = Cart.objects.get(user=user)
+            return cart, list(cart.items.all())
+
+        state = store.load(user.pk)
+        if state is None:
+            cart = Cart.objects.filter(user=user).first()
+            if cart is None and not create:
+                raise Cart.DoesNotExist
+            state = CartState(
+                user.pk,
+                cart.version if cart else 0,
+                [item.to_dict() for item in cart.items.all()] if cart else [],
+            )
+            if not store.add(state):
+                # Another request made the cart hot first; use its copy.
+                state = store.load(user.pk) or state
+
+        cart = Cart(
+            user=user,
+            item_count=state.item_count,
+            subtotal=state.subtotal,
+            version=state.version,
+        )
+        items = [
+            CartItem(
+                cart=cart,
+                product_id=line['product_id'],
+                quantity=line['quantity'],
+                price=Decimal(line['price']),
+                name=line['name'],
+                image=line['image'],
+            )
+            for line in state.lines
+        ]
+        return cart, items
+
+    @staticmethod
+    def summary(user):
+        """``(item_count, subtotal, version)`` without creating a cart."""
+        store = get_cart_store()
+        if store is not None:
+            summary = store.summary(user.pk)
+            if summary is not None:
+                return summary
+        summary = Cart.objects.filter(user=user).values_list(
+            'item_count', 'subtotal', 'version',
+        ).first()
+        return summary or (0, Decimal('0.00'), 0)
+
+    @staticmethod
+    def plan(cart, items, operations):
+        """Run ``operations`` in memory over ``items``; raises CartOperationError."""
+        existing = {item.product_id: item for item in items}
+        original_quantities = {item.pk: item.quantity for item in items}
+        lines = dict(existing)
+        products = Product.objects.in_bulk({
+            operation['product_id'] for operation in operations
+            if operation['op'] == CartOperation.ADD.value
+        })
+
+        for index, operation in enumerate(operations):
+            if operation['op'] == CartOperation.CLEAR.value:
+                if not lines:
+                    raise CartOperationError(index, _("Cart is already empty"))
+                lines.clear()
+                continue
+
+            product_id = operation['product_id']
+            item = lines.get(product_id)
+
+            if operation['op'] == CartOperation.REMOVE.value:
+                if item is None:
+                    raise CartOperationError(index, _("Product not found in cart"), not_found=True)
+                del lines[product_id]
+                continue
+
+            if operation['op'] == CartOperation.SET.value:
+                if item is None:
+                    raise CartOperationError(index, _("Product not found in cart"), not_found=True)
+                quantity = operation['quantity']
+            elif item is not None:
+                quantity = item.quantity + operation['quantity']
+            else:
+                product = products.get(product_id)
+                if product is None:
+                    raise CartOperationError(index, _("Product not found"), not_found=True)
+                item = lines[product_id] = CartItem(
+                    cart=cart,
+                    product=product,
+                    quantity=0,
+                    price=product.price,
+                    name=product.name,
+                    image=product.first_image_url,
+                )
+                quantity = operation['quantity']
+
+            if quantity > CartSettings.MAX_QUANTITY_PER_ITEM:
+                raise CartOperationError(
+                    index,
+                    _("Total quantity cannot exceed %(max)s") % {
+                        "max": CartSettings.MAX_QUANTITY_PER_ITEM
+                    },
+                )
+            item.quantity = quantity
+
+        # A line removed and added again in the same batch is a new row.
+        removed = [
+            item.pk for product_id, item in existing.items()
+            if lines.get(product_id) is None or lines[product_id].pk is None
+        ]
+        created = [item for item in lines.values() if item.pk is None]
+        updated = [
+            item for item in lines.values()
+            if item.pk is not None and item.quantity != original_quantities[item.pk]
+        ]
+        return CartChanges(
+            sorted(lines.values(), key=lambda item: (item.pk is None, item.pk or 0)),
+            created,
+            updated,
+            removed,
+        )
+
+    @staticmethod
+    def _write(cart, changes):
+        """Swap the cart to the next version and write the lines, or return False."""
+        store = get_cart_store()
+        if store is not None:
+            state = CartState(
+                cart.user_id,
+                cart.version + 1,
+                [item.to_dict() for item in changes.lines],
+            )
+            if not store.swap(cart.version, state):
+                return False
+            cart.item_count = changes.item_count
+            cart.subtotal = changes.subtotal
+            cart.version = state.version
+            if store.mark_dirty(cart.user_id):
+                CartService._schedule_flush(cart.user_id)
+            return True
+
+        now = timezone.now()
+        with transaction.atomic():
+            swapped = Cart.objects.filter(pk=cart.pk, version=cart.version).update(
+                item_count=changes.item_count,
+                subtotal=changes.subtotal,
+                version=F('version') + 1,
+                updated_at=now,
+            )
+            if not swapped:
+                return False
+
+            # The swap holds the cart row until commit, so these writes
+            # cannot interleave with another writer's.
+            if changes.removed:
+                CartItem.objects.filter(pk__in=changes.removed).delete()
+            if changes.created:
+                CartItem.objects.bulk_create(changes.created)
+            if changes.updated:
+                for item in changes.updated:
+                    item.updated_at = now
+                CartItem.objects.bulk_update(
+                    changes.updated, ['quantity', 'price', 'name', 'image', 'updated_at'],
+                )
+
+        cart.item_count = changes.item_count
+        cart.subtotal = changes.subtotal
+        cart.version += 1
+        cart.updated_at = now
+        changes.lines.sort(key=lambda item: item.pk)
+        return True
+
+    @staticmethod
+    def _schedule_flush(user_id):
+        from cart.tasks import flush_cart
+
+        try:
+            flush_cart.delay(user_id)
+        except Exception:
+            # The cart stays dirty, so the periodic sweep persists it.
+            logger.warning("Could not queue write-behind for cart of user %s", user_id, exc_info=True)
+
+    @staticmethod
+    def flush(user_id):
+        """
+        Write the hot cart of ``user_id`` to Postgres if it is newer than
+        the stored row. Returns True if anything was written.
+        """
+        store = get_cart_store()
+        if store is None:
+            return False
+        with transaction.atomic():
+            cart, _created = Cart.objects.select_for_update().get_or_create(user_id=user_id)
+            # Read under the row lock so concurrent flushes apply in order.
+            state = store.load(user_id)
+            written = state is not None and CartService._persist(cart, state)
+        store.mark_clean(user_id, state.version if state is not None else None)
+        return written
+
+    @staticmethod
+    def _persist(cart, state):
+        """Make the locked ``cart`` row and its lines match ``state``."""
+        if state.version <= cart.version:
+            return False
+
+        lines = {line['product_id']: line for line in state.lines}
+        existing = {item.product_id: item for item in cart.items.all()}
+        removed = [item.pk for product_id, item in existing.items() if product_id not in lines]
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+
+        now = timezone.now()
+        updated = []
+        for product_id, item in existing.items():
+            line = lines.get(product_id)
+            if line is None:
+                continue
+            # ``refresh`` may have repriced the line, so the snapshot is
+            # copied along with the quantity.
+            values = (line['quantity'], Decimal(line['price']), line['name'], line['image'])
+            if values != (item.quantity, item.price, item.name, item.image):
+                item.quantity, item.price, item.name, item.image = values
+                item.updated_at = now
+                updated.append(item)
+        if updated:
+            CartItem.objects.bulk_update(
+                updated, ['quantity', 'price', 'name', 'image', 'updated_at'],
+            )
+
+        new_ids = [product_id for product_id in lines if product_id not in existing]
+        if new_ids:
+            # A product hard-deleted while only in the hot cart is dropped.
+            live_ids = set(Product.objects.filter(pk__in=new_ids).values_list('pk', flat=True))
+            CartItem.objects.bulk_create([
+                CartItem(
+                    cart=cart,
+                    product_id=product_id,
+                    quantity=lines[product_id]['quantity'],
+                    price=Decimal(lines[product_id]['price']),
+                    name=lines[product_id]['name'],
+                    image=lines[product_id]['image'],
+                )
+                for product_id in new_ids if product_id in live_ids
+            ])
+
+        cart.item_count = state.item_count
+        cart.subtotal = state.subtotal
+        cart.version = state.version
+        cart.save(update_fields=['item_count', 'subtotal', 'version', 'updated_at'])
+        return True
+
+    @staticmethod
+    def checkout_items(user):
+        """
+        The cart and lines to turn into an order. Call inside the order's
+        transaction; without a hot store the cart row stays locked until
+        it commits.
+        """
+        if get_cart_store() is None:
+            cart, _created = Cart.objects.select_for_update().get_or_create(user=user)
+            return cart, list(cart.items.all())
+        return CartService.read(user)
+
+    @staticmethod
+    def clear_after_checkout(cart, items):
+        """
+        Empty the cart that ``checkout_items`` returned, as the last step
+        of the order's transaction. With a hot store the empty cart is
+        written to Postgres first and then swapped in; a cart changed
+        since it was read raises CartVersionConflict, rolling the order back.
+        """
+        store = get_cart_store()
+        if store is None:
+            CartItem.objects.filter(cart=cart).delete()
+            cart.record_change(
+                count_delta=-len(items),
+                subtotal_delta=-sum((item.line_total for item in items), Decimal('0.00')),
+            )
+            return
+
+        state = CartState(cart.user_id, cart.version + 1)
+        row, _created = Cart.objects.select_for_update().get_or_create(user_id=cart.user_id)
+        CartService._persist(row, state)
+        if not store.swap(cart.version, state):
+            raise CartVersionConflict(cart)
+        store.mark_clean(cart.user_id, state.version)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cart.models import Cart
+from core.constants import CartSettings
+
+logger = logging.getLogger(__name__)
+
+
+class CartCompactionService:
+    """
+    Delete carts that no longer belong to an active shopper: empty carts
+    and carts untouched for ``CART_EXPIRY_DAYS``.
+
+    Work happens in batches of ``CartSettings.COMPACTION_BATCH_SIZE``
+    carts, each in its own short transaction. Rows a cart write currently
+    holds are skipped rather than waited for. A write racing the delete
+    loses its version swap and retries against a new cart.
+    """
+
+    @staticmethod
+    def run(now=None):
+        """Returns the number of deleted carts and cart lines, per reason."""
+        now = now or timezone.now()
+        expired_before = now - timedelta(days=settings.CART_EXPIRY_DAYS)
+        report = {'empty_carts': 0, 'expired_carts': 0, 'cart_items': 0}
+
+        for reason, condition in (
+            ('empty_carts', Q(item_count=0)),
+            ('expired_carts', Q(updated_at__lt=expired_before)),
+        ):
+            while True:
+                carts, items = CartCompactionService._delete_batch(condition)
+                report[reason] += carts
+                report['cart_items'] += items
+                if carts < CartSettings.COMPACTION_BATCH_SIZE:
+                    break
+
+        logger.info("Cart compaction freed %s", report)
+        return report
+
+    @staticmethod
+    def _delete_batch(condition):
+        with transaction.atomic():
+            ids = list(
+                Cart.objects
+                .select_for_update(skip_locked=True)
+                .filter(condition)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:CartSettings.COMPACTION_BATCH_SIZE]
+            )
+            if not ids:
+                return 0, 0
+            _total, deleted = Cart.objects.filter(pk__in=ids).delete()
+        return deleted.get('cart.Cart', 0), deleted.get('cart.CartItem', 0)
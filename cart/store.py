@@ -0,0 +1,255 @@
+"""
+Hot cart storage of cart app.
+
+With ``settings.CART_STORE`` configured, carts live in a store outside
+Postgres (Redis hashes in production, process memory in tests) and every
+cart read and write goes there. The ``Cart`` / ``CartItem`` rows are
+written behind by ``CartService.flush``: from a Celery task after the
+first change to a clean cart, from a periodic sweep, and synchronously
+at checkout. Without ``CART_STORE`` the cart is read and written in
+Postgres directly.
+
+A stored cart is only ever replaced as a whole by a version
+compare-and-swap, the same protocol the database path uses.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from decimal import Decimal
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class CartState:
+    """A cart as kept in the hot store: its version and ordered lines."""
+
+    def __init__(self, user_id, version=0, lines=()):
+        self.user_id = user_id
+        self.version = version
+        self.lines = list(lines)
+
+    @property
+    def item_count(self):
+        return len(self.lines)
+
+    @property
+    def subtotal(self):
+        return sum(
+            (Decimal(line['price']) * line['quantity'] for line in self.lines),
+            Decimal('0.00'),
+        )
+
+
+class BaseCartStore:
+    """
+    Interface of a hot cart store.
+
+    ``swap`` replaces the stored cart only if it is still at
+    ``expected_version``. ``mark_dirty`` / ``mark_clean`` track carts
+    whose latest version is not yet in Postgres; ``mark_clean`` leaves
+    the cart dirty if it changed after ``version`` was flushed.
+    """
+
+    def __init__(self, params=None):
+        self.timeout = settings.CART_STORE_TIMEOUT
+
+    def load(self, user_id):
+        """The stored CartState, or ``None`` if the cart is not hot."""
+        raise NotImplementedError
+
+    def summary(self, user_id):
+        """``(item_count, subtotal, version)`` without reading the lines."""
+        raise NotImplementedError
+
+    def add(self, state):
+        """Store a cart read from Postgres unless one is already hot."""
+        raise NotImplementedError
+
+    def swap(self, expected_version, state):
+        raise NotImplementedError
+
+    def mark_dirty(self, user_id):
+        """Returns True if the cart was clean before."""
+        raise NotImplementedError
+
+    def mark_clean(self, user_id, version):
+        raise NotImplementedError
+
+    def dirty(self, limit):
+        raise NotImplementedError
+
+
+class RedisCartStore(BaseCartStore):
+    """
+    One hash per cart: ``version``, ``item_count``, ``subtotal`` and a
+    ``line:<position>`` field per line, plus a set of dirty user ids.
+    """
+
+    KEY = 'cart:{user_id}'
+    DIRTY_KEY = 'cart:dirty'
+
+    def __init__(self, params=None):
+        super().__init__(params)
+        self.client = redis.Redis.from_url(params['LOCATION'])
+
+    def _key(self, user_id):
+        return self.KEY.format(user_id=user_id)
+
+    def _mapping(self, state):
+        mapping = {
+            'version': state.version,
+            'item_count': state.item_count,
+            'subtotal': str(state.subtotal),
+        }
+        for position, line in enumerate(state.lines):
+            mapping[f'line:{position:04d}'] = json.dumps(line)
+        return mapping
+
+    def load(self, user_id):
+        fields = self.client.hgetall(self._key(user_id))
+        if not fields:
+            return None
+        lines = [
+            json.loads(value) for name, value in sorted(fields.items())
+            if name.startswith(b'line:')
+        ]
+        return CartState(user_id, int(fields[b'version']), lines)
+
+    def summary(self, user_id):
+        item_count, subtotal, version = self.client.hmget(
+            self._key(user_id), 'item_count', 'subtotal', 'version',
+        )
+        if version is None:
+            return None
+        return int(item_count), Decimal(subtotal.decode()), int(version)
+
+    def _replace(self, user_id, state, expected_version):
+        key = self._key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, 'version')
+                if expected_version is None:
+                    if current is not None:
+                        return False
+                elif current is None or int(current) != expected_version:
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping=self._mapping(state))
+                pipe.expire(key, self.timeout)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    def add(self, state):
+        return self._replace(state.user_id, state, expected_version=None)
+
+    def swap(self, expected_version, state):
+        return self._replace(state.user_id, state, expected_version)
+
+    def mark_dirty(self, user_id):
+        return bool(self.client.sadd(self.DIRTY_KEY, user_id))
+
+    def mark_clean(self, user_id, version):
+        key = self._key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, 'version')
+                if current is not None and int(current) != version:
+                    return
+                pipe.multi()
+                pipe.srem(self.DIRTY_KEY, user_id)
+                pipe.execute()
+            except redis.WatchError:
+                pass
+
+    def dirty(self, limit):
+        return [int(user_id) for user_id in self.client.srandmember(self.DIRTY_KEY, limit)]
+
+
+class MemoryCartStore(BaseCartStore):
+    """Per-process stand-in for RedisCartStore, for tests and development."""
+
+    def __init__(self, params=None):
+        super().__init__(params)
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._carts = {}
+        self._dirty = set()
+
+    def _copy(self, state):
+        return CartState(state.user_id, state.version, [dict(line) for line in state.lines])
+
+    def load(self, user_id):
+        with self._lock:
+            state = self._carts.get(user_id)
+            return self._copy(state) if state is not None else None
+
+    def summary(self, user_id):
+        state = self.load(user_id)
+        if state is None:
+            return None
+        return state.item_count, state.subtotal, state.version
+
+    def add(self, state):
+        with self._lock:
+            if state.user_id in self._carts:
+                return False
+            self._carts[state.user_id] = self._copy(state)
+            return True
+
+    def swap(self, expected_version, state):
+        with self._lock:
+            current = self._carts.get(state.user_id)
+            if current is None or current.version != expected_version:
+                return False
+            self._carts[state.user_id] = self._copy(state)
+            return True
+
+    def mark_dirty(self, user_id):
+        with self._lock:
+            was_clean = user_id not in self._dirty
+            self._dirty.add(user_id)
+            return was_clean
+
+    def mark_clean(self, user_id, version):
+        with self._lock:
+            current = self._carts.get(user_id)
+            if current is None or current.version == version:
+                self._dirty.discard(user_id)
+
+    def dirty(self, limit):
+        with self._lock:
+            return sorted(self._dirty)[:limit]
+
+
+def get_cart_store():
+    """The configured hot cart store, or ``None`` to use Postgres directly."""
+    global _store
+    config = settings.CART_STORE
+    if not config:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = import_string(config['BACKEND'])(config)
+        return _store
+
+
+@receiver(setting_changed)
+def reset_cart_store(*, setting, **kwargs):
+    global _store
+    if setting in ('CART_STORE', 'CART_STORE_TIMEOUT'):
+        _store = None
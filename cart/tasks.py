@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import logging
+
+from celery import shared_task
+
+from cart.services.cart_service import CartService
+from cart.services.compaction_service import CartCompactionService
+from cart.store import get_cart_store
+from core.constants import CartSettings
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_cart(user_id):
+    """Write one hot cart behind to Postgres."""
+    return CartService.flush(user_id)
+
+
+@shared_task
+def flush_dirty_carts():
+    """Periodic sweep for hot carts whose write-behind was lost or failed."""
+    store = get_cart_store()
+    if store is None:
+        return "No hot cart store configured."
+
+    flushed = 0
+    for user_id in store.dirty(CartSettings.FLUSH_BATCH_SIZE):
+        try:
+            flushed += CartService.flush(user_id)
+        except Exception:
+            logger.exception("Failed to flush cart of user %s", user_id)
+    return f"Flushed {flushed} carts."
+
+
+@shared_task
+def compact_carts():
+    """Delete empty and long-untouched carts."""
+    report = CartCompactionService.run()
+    return (
+        f"Deleted {report['empty_carts']} empty carts, {report['expired_carts']} "
+        f"expired carts and {report['cart_items']} cart items."
+    )
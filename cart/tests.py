@@ -1,13 +1,37 @@
 from __future__ import annotations
 
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.db import connection
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Sum
+from django.db.migrations.executor import MigrationExecutor
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
 import json
 
+from cart import metrics as cart_metrics
 from cart.models import Cart
+from cart.models import CartItem
+from cart.services.cart_service import CartService
+from cart.services.compaction_service import CartCompactionService
+from cart.store import get_cart_store
+from cart.tasks import compact_carts
+from cart.tasks import flush_dirty_carts
+from core.constants import CartSettings
+from orders.models import FlashSale
 from products.models import Product, Category
 
 User = get_user_model()
@@ -21,37 +45,44 @@ class CartModelTest(TestCase):
             email='test@example.com',
             password='testpass123'
         )
-        self.cart = Cart.objects.create(
-            user=self.user,
-            items=[
-                {
-                    'product_id': 1,
-                    'quantity': 2,
-                    'price': '10.00',
-                    'name': 'Test Product',
-                    'image': 'test.jpg'
-                }
-            ]
+        self.category = Category.objects.create(name='Model Category')
+        self.product1 = Product.objects.create(
+            name='Test Product', price=Decimal('10.00'), category=self.category,
+        )
+        self.product2 = Product.objects.create(
+            name='Another Product', price=Decimal('5.00'), category=self.category,
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(
+            cart=self.cart,
+            product=self.product1,
+            quantity=2,
+            price=Decimal('10.00'),
+            name='Test Product',
+            image='test.jpg',
         )
+        self.cart.record_change(1, Decimal('20.00'))
 
     def test_cart_creation(self):
         """Test cart creation with valid data"""
         self.assertEqual(self.cart.user.email, 'test@example.com')
-        self.assertEqual(len(self.cart.items), 1)
-        self.assertEqual(self.cart.items[0]['product_id'], 1)
+        self.assertEqual(self.cart.items.count(), 1)
+        self.assertEqual(self.cart.items.get().product_id, self.product1.id)
 
     def test_get_item_count(self):
         """Test get_item_count method"""
         self.assertEqual(self.cart.get_item_count(), 1)
         
         # Add another item and test again
-        self.cart.items.append({
-            'product_id': 2,
-            'quantity': 1,
-            'price': '5.00',
-            'name': 'Another Product',
-            'image': 'test2.jpg'
-        })
+        CartItem.objects.create(
+            cart=self.cart,
+            product=self.product2,
+            quantity=1,
+            price=Decimal('5.00'),
+            name='Another Product',
+            image='test2.jpg',
+        )
+        self.cart.record_change(1, Decimal('5.00'))
         self.assertEqual(self.cart.get_item_count(), 2)
 
     def test_get_total(self):
@@ -59,15 +90,68 @@ class CartModelTest(TestCase):
         self.assertEqual(self.cart.get_total(), 20.00)
         
         # Add another item and test again
-        self.cart.items.append({
-            'product_id': 2,
-            'quantity': 1,
-            'price': '5.00',
-            'name': 'Another Product',
-            'image': 'test2.jpg'
-        })
+        CartItem.objects.create(
+            cart=self.cart,
+            product=self.product2,
+            quantity=1,
+            price=Decimal('5.00'),
+            name='Another Product',
+            image='test2.jpg',
+        )
+        self.cart.record_change(1, Decimal('5.00'))
         self.assertEqual(self.cart.get_total(), 25.00)
 
+    def test_one_line_per_product(self):
+        """The (cart, product) pair is unique"""
+        with self.assertRaises(IntegrityError):
+            CartItem.objects.create(
+                cart=self.cart,
+                product=self.product1,
+                quantity=1,
+                price=Decimal('10.00'),
+                name='Test Product',
+            )
+
+
+class CartItemMigrationTest(TransactionTestCase):
+    """The JSON cart lines are moved into cart_items and back"""
+
+    migrate_from = [('cart', '0002_cartitem')]
+    migrate_to = [('cart', '0004_remove_cart_legacy_items')]
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_json_lines_are_copied(self):
+        apps = self._migrate(self.migrate_from)
+        user = apps.get_model('accounts', 'User').objects.create(email='legacy@example.com')
+        category = apps.get_model('products', 'Category').objects.create(name='Legacy')
+        Product = apps.get_model('products', 'Product')
+        product = Product.objects.create(name='Kept', price=Decimal('7.50'), category=category)
+        apps.get_model('cart', 'Cart').objects.create(user=user, legacy_items=[
+            {'product_id': product.id, 'quantity': 2, 'price': '7.50', 'name': 'Kept', 'image': 'k.jpg'},
+            {'product_id': product.id, 'quantity': 1, 'price': '7.50', 'name': 'Kept', 'image': 'k.jpg'},
+            {'product_id': product.id + 999, 'quantity': 1, 'price': '1.00', 'name': 'Gone'},
+        ])
+
+        apps = self._migrate(self.migrate_to)
+        lines = list(apps.get_model('cart', 'CartItem').objects.values(
+            'product_id', 'quantity', 'price', 'name', 'image',
+        ))
+        self.assertEqual(lines, [{
+            'product_id': product.id,
+            'quantity': 3,
+            'price': Decimal('7.50'),
+            'name': 'Kept',
+            'image': 'k.jpg',
+        }])
+
 
 class CartAPITest(APITestCase):
     """Test cases for Cart API endpoints"""
@@ -120,7 +204,9 @@ class CartAPITest(APITestCase):
             'update': reverse('api_update_cart_item'),
             'remove': reverse('api_remove_from_cart'),
             'clear': reverse('api_clear_cart'),
+            'batch': reverse('api_batch_cart'),
         }
+        cache.delete_many([cart_metrics.CAS_RETRIES_KEY, cart_metrics.CAS_CONFLICTS_KEY])
 
     def test_add_to_cart(self):
         """Test adding a product to cart"""
@@ -304,6 +390,296 @@ class CartAPITest(APITestCase):
         self.assertEqual(response.data['cart_item_count'], 0)
         self.assertEqual(response.data['cart_total'], 0.00)
 
+    def test_add_same_product_merges_into_one_line(self):
+        """Adding a product twice updates its single line in place"""
+        for _ in range(2):
+            self.client.post(
+                self.cart_urls['add'],
+                json.dumps({'product_id': self.product1.id, 'quantity': 2}),
+                content_type='application/json'
+            )
+
+        lines = CartItem.objects.filter(cart__user=self.user)
+        self.assertEqual(lines.count(), 1)
+        self.assertEqual(lines.get().quantity, 4)
+
+    def test_add_to_cart_exceeding_max_quantity(self):
+        """Merging past the per-item maximum is rejected and leaves the line"""
+        from core.constants import CartSettings
+
+        self.client.post(
+            self.cart_urls['add'],
+            json.dumps({'product_id': self.product1.id, 'quantity': CartSettings.MAX_QUANTITY_PER_ITEM}),
+            content_type='application/json'
+        )
+        response = self.client.post(
+            self.cart_urls['add'],
+            json.dumps({'product_id': self.product1.id, 'quantity': 1}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            CartItem.objects.get(cart__user=self.user).quantity,
+            CartSettings.MAX_QUANTITY_PER_ITEM,
+        )
+
+    def _post(self, name, data, **extra):
+        return self.client.post(
+            self.cart_urls[name], json.dumps(data), content_type='application/json', **extra
+        )
+
+    def test_stored_aggregates_follow_every_mutation(self):
+        """Count, subtotal and version are kept in step with the lines"""
+        steps = [
+            ('add', {'product_id': self.product1.id, 'quantity': 2}),
+            ('add', {'product_id': self.product2.id, 'quantity': 1}),
+            ('add', {'product_id': self.product1.id, 'quantity': 1}),
+            ('update', {'product_id': self.product2.id, 'quantity': 4}),
+            ('remove', {'product_id': self.product1.id}),
+        ]
+        for version, (name, data) in enumerate(steps, start=1):
+            response = self._post(name, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            cart = Cart.objects.get(user=self.user)
+            self.assertEqual(cart.version, version)
+            lines = cart.items.aggregate(count=Count('id'), total=Sum(F('price') * F('quantity')))
+            self.assertEqual(cart.item_count, lines['count'])
+            self.assertEqual(cart.subtotal, lines['total'] or Decimal('0.00'))
+            self.assertEqual(response.data['cart_total'], cart.subtotal)
+
+        self.assertEqual(cart.subtotal, Decimal('60.00'))  # 4*15
+
+        self._post('clear', {})
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (0, Decimal('0.00')))
+
+    def test_cart_summary_reads_stored_values(self):
+        """The summary never touches the cart lines"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 3})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.cart_urls['summary'])
+
+        self.assertEqual(response.data['cart_item_count'], 1)
+        self.assertEqual(response.data['cart_total'], Decimal('30.00'))
+        self.assertFalse([q for q in ctx.captured_queries if 'cart_items' in q['sql']])
+
+    def test_cart_summary_without_cart(self):
+        """Polling the summary does not create a cart"""
+        response = self.client.get(self.cart_urls['summary'])
+
+        self.assertEqual(response.data['cart_item_count'], 0)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_get_cart_without_cart(self):
+        """Viewing an empty cart does not create one either"""
+        for params in ({}, {'refresh': '1'}):
+            response = self.client.get(self.cart_urls['get'], params)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((response.data['items'], response.data['version']), ([], 0))
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_batch_applies_operations_in_order(self):
+        """Add, set and remove in one request, returning the new cart"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+        product3 = Product.objects.create(
+            name='Test Product 3', price=2.50, category=self.category
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post('batch', {'operations': [
+                {'op': 'add', 'product_id': self.product2.id, 'quantity': 2},
+                {'op': 'add', 'product_id': product3.id},
+                {'op': 'set', 'product_id': self.product1.id, 'quantity': 5},
+                {'op': 'add', 'product_id': self.product2.id, 'quantity': 1},
+                {'op': 'remove', 'product_id': product3.id},
+            ]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(i['product_id'], i['quantity']) for i in response.data['items']],
+            [(self.product1.id, 5), (self.product2.id, 3)],
+        )
+        self.assertEqual(response.data['cart_item_count'], 2)
+        self.assertEqual(response.data['cart_total'], Decimal('95.00'))  # 5*10 + 3*15
+        self.assertEqual(response.data['version'], 2)
+
+        writes = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(len([w for w in writes if 'INTO "cart_items"' in w]), 1)
+        self.assertEqual(len([w for w in writes if w.startswith('UPDATE "cart_items"')]), 1)
+        self.assertEqual(len([w for w in writes if w.startswith('UPDATE "carts"')]), 1)
+
+    def test_batch_is_all_or_nothing(self):
+        """A failing operation leaves the cart exactly as it was"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        response = self._post('batch', {'operations': [
+            {'op': 'add', 'product_id': self.product2.id, 'quantity': 2},
+            {'op': 'remove', 'product_id': 999},
+        ]})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['operation'], 1)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.version), (1, 1))
+        self.assertEqual(
+            list(cart.items.values_list('product_id', 'quantity')),
+            [(self.product1.id, 1)],
+        )
+
+    def test_batch_remove_then_add_again(self):
+        """Removing and re-adding a product in one batch keeps a single line"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 4})
+
+        response = self._post('batch', {'operations': [
+            {'op': 'remove', 'product_id': self.product1.id},
+            {'op': 'add', 'product_id': self.product1.id, 'quantity': 2},
+        ]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.user).values_list('quantity', flat=True)),
+            [2],
+        )
+        self.assertEqual(response.data['cart_total'], Decimal('20.00'))
+
+    def test_batch_rejects_invalid_operations(self):
+        """Unknown ops and a set without quantity fail validation"""
+        for operation in (
+            {'op': 'explode', 'product_id': self.product1.id},
+            {'op': 'set', 'product_id': self.product1.id},
+        ):
+            response = self._post('batch', {'operations': [operation]})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_to_cart_takes_no_row_locks(self):
+        """Uncontended writes go through the version swap, not FOR UPDATE"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertFalse([q for q in ctx.captured_queries if 'FOR UPDATE' in q['sql']])
+
+    def test_stale_if_match_is_rejected(self):
+        """A write planned against an old version answers 412 and changes nothing"""
+        response = self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+        etag = response['ETag']
+        self._post('add', {'product_id': self.product2.id, 'quantity': 1}, HTTP_IF_MATCH=etag)
+
+        response = self._post(
+            'update', {'product_id': self.product1.id, 'quantity': 5}, HTTP_IF_MATCH=etag,
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(CartItem.objects.get(product=self.product1).quantity, 1)
+        self.assertEqual(cart_metrics.snapshot()['cas_conflicts'], 1)
+
+    def test_concurrent_write_is_retried(self):
+        """Losing the version swap re-reads the cart and counts a retry"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+        write = CartService._write
+        raced = []
+
+        def racing_write(cart, changes):
+            if not raced:
+                # Another request commits first and bumps the version.
+                raced.append(True)
+                Cart.objects.filter(pk=cart.pk).update(version=F('version') + 1)
+            return write(cart, changes)
+
+        with mock.patch.object(CartService, '_write', side_effect=racing_write):
+            response = self._post('add', {'product_id': self.product1.id, 'quantity': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 3)
+        self.assertEqual(CartItem.objects.get(product=self.product1).quantity, 3)
+        self.assertEqual(cart_metrics.snapshot(), {'cas_retries': 1, 'cas_conflicts': 0})
+
+    def test_exhausted_retries_answer_conflict(self):
+        """A cart that keeps changing gives up with 409 after the retry budget"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        with mock.patch.object(CartService, '_write', return_value=False):
+            response = self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            cart_metrics.snapshot(),
+            {'cas_retries': CartSettings.MAX_WRITE_RETRIES + 1, 'cas_conflicts': 1},
+        )
+
+    @override_settings(STOCK_RESERVATION_ENABLED=True)
+    def test_refresh_reprices_lines(self):
+        """Refresh reports price and stock deltas and stores current prices"""
+        product3 = Product.objects.create(
+            name='Test Product 3', price=2.50, category=self.category, stock_quantity=1,
+        )
+        for product, quantity in ((self.product1, 2), (self.product2, 1), (product3, 3)):
+            self._post('add', {'product_id': product.id, 'quantity': quantity})
+        Product.objects.filter(pk=self.product1.pk).update(price=Decimal('12.00'))
+        Product.objects.filter(pk=self.product2.pk).update(is_in_stock=False)
+        sale = FlashSale.objects.create(
+            name='Cart Sale',
+            discount_percent=Decimal('25.00'),
+            start_date=timezone.now() - timedelta(hours=1),
+            end_date=timezone.now() + timedelta(hours=1),
+            is_active=True,
+        )
+        sale.products.add(self.product1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.cart_urls['get'], {'refresh': '1'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = {line['product_id']: line for line in response.data['items']}
+        self.assertEqual(
+            (lines[self.product1.id]['price_delta'], lines[self.product1.id]['effective_price']),
+            ('2.00', '9.00'),
+        )
+        self.assertEqual(lines[self.product2.id]['stock_shortfall'], 1)
+        self.assertEqual(lines[product3.id]['stock_shortfall'], 2)
+        self.assertTrue(response.data['changed'])
+        self.assertEqual(response.data['total'], Decimal('46.50'))  # 2*12 + 15 + 3*2.50
+        self.assertEqual(response.data['effective_total'], Decimal('40.50'))  # 2*9 + 15 + 7.50
+        self.assertEqual(CartItem.objects.get(product=self.product1).price, Decimal('12.00'))
+
+        reads = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len([q for q in reads if 'FROM "products"' in q]), 1)
+        self.assertEqual(len([q for q in reads if '"flash_sales"' in q]), 1)
+
+    def test_refresh_ignores_stock_count_without_reservation(self):
+        """Without stock reservation an in-stock line has no shortfall whatever its count"""
+        Product.objects.filter(pk=self.product1.pk).update(stock_quantity=0)
+        self._post('add', {'product_id': self.product1.id, 'quantity': 2})
+
+        response = self.client.get(self.cart_urls['get'], {'refresh': '1'})
+
+        self.assertEqual(response.data['items'][0]['stock_shortfall'], 0)
+        self.assertFalse(response.data['changed'])
+
+    def test_refresh_without_changes_writes_nothing(self):
+        """An up-to-date cart is reported unchanged and keeps its version"""
+        self._post('add', {'product_id': self.product1.id, 'quantity': 1})
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.cart_urls['get'], {'refresh': 'true'})
+
+        self.assertFalse(response.data['changed'])
+        self.assertEqual(response.data['version'], 1)
+        self.assertFalse([
+            q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ])
+
     def test_add_to_cart_invalid_data(self):
         """Test adding to cart with invalid data"""
         data = {
@@ -373,6 +749,28 @@ class CartAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.data['status'], 'error')
 
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_each_request_authenticates_once(self):
+        """The decorator and DRF share one token check and one user lookup"""
+        line = {'product_id': self.product1.id, 'quantity': 1}
+        requests = [
+            ('add', line), ('get', None), ('summary', None),
+            ('update', line), ('remove', {'product_id': self.product1.id}), ('clear', {}),
+        ]
+        self._post('add', line)
+
+        for name, data in requests:
+            if name == 'clear':
+                self._post('add', line)
+            with CaptureQueriesContext(connection) as ctx:
+                if data is None:
+                    response = self.client.get(self.cart_urls[name])
+                else:
+                    response = self._post(name, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, name)
+            user_queries = [q for q in ctx.captured_queries if 'FROM "users"' in q['sql']]
+            self.assertEqual(len(user_queries), 1, name)
+
     def test_unauthorized_access(self):
         """Test accessing cart endpoints without authentication"""
         # Create a new client without authentication
@@ -381,3 +779,193 @@ class CartAPITest(APITestCase):
         response = unauth_client.get(self.cart_urls['get'])
         # Should return 401 or 403 depending on your auth setup
         self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+
+class CartCompactionTest(TestCase):
+    """Empty and long-untouched carts are deleted in batches"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Compaction Category')
+        self.product = Product.objects.create(name='Kept', price=5, category=category)
+
+    def _cart(self, email, lines=0):
+        cart = Cart.objects.create(
+            user=User.objects.create_user(email=email, password='pass'),
+            item_count=lines,
+        )
+        if lines:
+            CartItem.objects.create(cart=cart, product=self.product, price=5, name='Kept')
+        return cart
+
+    @mock.patch.object(CartSettings, 'COMPACTION_BATCH_SIZE', 2)
+    @override_settings(CART_EXPIRY_DAYS=30)
+    def test_deletes_empty_and_expired_carts(self):
+        for i in range(5):
+            self._cart(f'empty{i}@example.com')
+        active = self._cart('active@example.com', lines=1)
+        stale = self._cart('stale@example.com', lines=1)
+        Cart.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(days=31))
+
+        report = CartCompactionService.run()
+
+        self.assertEqual(report, {'empty_carts': 5, 'expired_carts': 1, 'cart_items': 1})
+        self.assertEqual(list(Cart.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertEqual(CartItem.objects.get().cart_id, active.pk)
+        self.assertEqual(
+            compact_carts(), "Deleted 0 empty carts, 0 expired carts and 0 cart items."
+        )
+
+
+@override_settings(CART_STORE={'BACKEND': 'cart.store.MemoryCartStore'})
+class HotCartStoreTest(APITestCase):
+    """Carts served from the hot store and written behind to Postgres"""
+
+    def setUp(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(email='hot@example.com', password='testpass123')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+        category = Category.objects.create(name='Hot Category')
+        self.product1 = Product.objects.create(name='Hot 1', price=10, category=category)
+        self.product2 = Product.objects.create(name='Hot 2', price=15, category=category)
+        get_cart_store().clear()
+        patcher = mock.patch('cart.tasks.flush_cart.delay')
+        self.flush_delay = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add(self, product, quantity=1):
+        return self.client.post(
+            reverse('api_add_to_cart'),
+            {'product_id': product.id, 'quantity': quantity},
+            format='json',
+        )
+
+    def _cart_table_queries(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if '"cart' in q['sql']]
+
+    def test_writes_and_reads_stay_off_cart_tables(self):
+        """After the first read, cart traffic never touches carts or cart_items"""
+        self._add(self.product1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._add(self.product2, 2)
+            self._add(self.product1)
+            cart = self.client.get(reverse('api_get_cart'))
+            summary = self.client.get(reverse('api_get_cart_summary'))
+
+        self.assertEqual(self._cart_table_queries(ctx), [])
+        self.assertEqual(
+            [(i['product_id'], i['quantity']) for i in cart.data['items']],
+            [(self.product1.id, 2), (self.product2.id, 2)],
+        )
+        self.assertEqual(summary.data['cart_total'], Decimal('50.00'))
+        self.assertEqual(summary.data['version'], 3)
+        self.assertFalse(CartItem.objects.exists())
+        # One write-behind is queued when the cart turns dirty, not per write.
+        self.flush_delay.assert_called_once_with(self.user.pk)
+
+    def test_flush_writes_cart_behind(self):
+        """Flushing makes the Postgres rows match the hot cart"""
+        self._add(self.product1, 3)
+        self._add(self.product2)
+        CartService.flush(self.user.pk)
+
+        self.client.post(
+            reverse('api_remove_from_cart'), {'product_id': self.product1.id}, format='json',
+        )
+        self.assertTrue(CartService.flush(self.user.pk))
+        self.assertFalse(CartService.flush(self.user.pk))
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.subtotal, cart.version), (1, Decimal('15.00'), 3))
+        self.assertEqual(
+            list(cart.items.values_list('product_id', 'quantity')), [(self.product2.id, 1)],
+        )
+        self.assertEqual(get_cart_store().dirty(10), [])
+
+    def test_flush_writes_repriced_lines(self):
+        """A line repriced in the hot cart is flushed with its new snapshot"""
+        self._add(self.product1, 2)
+        CartService.flush(self.user.pk)
+        Product.objects.filter(pk=self.product1.pk).update(price=12, name='Hot 1 v2')
+
+        response = self.client.get(reverse('api_get_cart'), {'refresh': '1'})
+        self.assertEqual(response.data['total'], Decimal('24.00'))
+        self.assertTrue(CartService.flush(self.user.pk))
+
+        cart = Cart.objects.get(user=self.user)
+        item = cart.items.get()
+        self.assertEqual((item.quantity, item.price, item.name), (2, Decimal('12.00'), 'Hot 1 v2'))
+        self.assertEqual(cart.subtotal, Decimal('24.00'))
+
+    def test_cart_is_loaded_from_postgres_on_first_use(self):
+        """A cart that is not hot yet is read from its rows"""
+        cart = Cart.objects.create(user=self.user, item_count=1, subtotal=Decimal('20.00'), version=4)
+        CartItem.objects.create(cart=cart, product=self.product1, quantity=2, price=10, name='Hot 1')
+
+        response = self._add(self.product1)
+
+        self.assertEqual(response.data['version'], 5)
+        self.assertEqual(response.data['cart_total'], Decimal('30.00'))
+
+    def test_periodic_sweep_flushes_dirty_carts(self):
+        """Carts whose write-behind task never ran are persisted by the sweep"""
+        self._add(self.product1, 2)
+
+        self.assertEqual(flush_dirty_carts(), "Flushed 1 carts.")
+        self.assertEqual(Cart.objects.get(user=self.user).item_count, 1)
+
+
+class CartItemProductReferenceTest(TestCase):
+    """Finding carts that reference a product is an index probe"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Reference Category')
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', price=Decimal('1.00'), category=category)
+            for i in range(200)
+        ])
+        users = User.objects.bulk_create([
+            User(email=f'shopper{i}@example.com') for i in range(2000)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(
+                cart=cart,
+                product=cls.products[(i * 7 + j) % 150],
+                quantity=1,
+                price=Decimal('1.00'),
+                name='Product',
+            )
+            for i, cart in enumerate(carts)
+            for j in range(3)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE cart_items')
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', password='testpass123', is_staff=True,
+        )
+
+    def test_reference_lookup_uses_product_index(self):
+        # Same shape as .exists(), which drops the default ordering.
+        plan = CartItem.objects.filter(product=self.products[0]).order_by()[:1].explain()
+        self.assertIn('idx_cart_items_product_id', plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_admin_delete_of_product_in_cart_is_soft(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        in_cart = self.products[0]
+        response = client.delete(reverse('products:admin_product_detail', args=[in_cart.id]))
+        self.assertTrue(response.data['is_soft_deleted'])
+        in_cart.refresh_from_db()
+        self.assertTrue(in_cart.is_deleted)
+
+        unused = self.products[199]
+        response = client.delete(reverse('products:admin_product_detail', args=[unused.id]))
+        self.assertFalse(response.data['is_soft_deleted'])
+        self.assertFalse(Product.objects.filter(pk=unused.pk).exists())
@@ -1,9 +1,9 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
+from decimal import Decimal
+
 from django.shortcuts import get_object_or_404
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAuthenticated
 from django.utils.translation import gettext as _
 
@@ -11,19 +11,19 @@ from products.models import Product
 from cart.models import Cart
 from .serializers import (
     AddToCartSerializer,
+    BatchCartSerializer,
     UpdateCartItemSerializer,
     RemoveFromCartSerializer
 )
+from .services.cart_service import CartOperationError, CartService, CartVersionConflict
+from core.authentication import RequestCachedJWTAuthentication
 from core.decorators import json_jwt_required, public_api
-from core.constants import CartSettings
-
-
-def calculate_cart_total(items):
-    return sum(float(item['price']) * item['quantity'] for item in items)
+from core.constants import CartOperation
 
 
 class CartBaseView(APIView): 
-    authentication_classes = [JWTAuthentication] # Đã sửa lại
+    # Shares the decorator's verified token instead of authenticating again
+    authentication_classes = [RequestCachedJWTAuthentication]
     permission_classes = [IsAuthenticated] # Đã sửa lại
 
     @classmethod
@@ -31,6 +31,62 @@ class CartBaseView(APIView):
         view = super().as_view(**initkwargs)
         return public_api(json_jwt_required(view))
 
+    def get_expected_version(self, request):
+        """The cart version from If-Match (``"3"``, ``W/"3"`` or ``3``), if any."""
+        value = request.headers.get('If-Match', '').strip()
+        if not value or value == '*':
+            return None
+        value = value.removeprefix('W/').strip('"')
+        if not value.isdigit():
+            raise ValueError(value)
+        return int(value)
+
+    def apply_operations(self, request, operations, create=True):
+        """
+        Run ``operations`` through the CartService and return ``(cart,
+        lines)``, or an error Response: 404/400 for missing carts or bad
+        operations, 412 for a stale If-Match version and 409 when
+        concurrent writers outlast the retries.
+        """
+        try:
+            expected_version = self.get_expected_version(request)
+        except ValueError:
+            return Response({
+                "status": "error",
+                "message": _("Invalid If-Match cart version")
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return CartService.apply(
+                request.user, operations,
+                expected_version=expected_version, create=create,
+            )
+        except Cart.DoesNotExist:
+            return Response({
+                "status": "error",
+                "message": _("Cart not found")
+            }, status=status.HTTP_404_NOT_FOUND)
+        except CartVersionConflict as e:
+            if e.exhausted:
+                response = Response({
+                    "status": "error",
+                    "message": _("Cart is being modified, please retry"),
+                    "version": e.cart.version
+                }, status=status.HTTP_409_CONFLICT)
+            else:
+                response = Response({
+                    "status": "error",
+                    "message": _("Cart has changed since it was read"),
+                    "version": e.cart.version
+                }, status=status.HTTP_412_PRECONDITION_FAILED)
+            return self.with_version(response, e.cart)
+
+    @staticmethod
+    def with_version(response, cart):
+        """Expose the cart version as the ETag clients send back in If-Match."""
+        response.headers['ETag'] = f'"{cart.version}"'
+        return response
+
 
 class AddToCartView(CartBaseView):
     def post(self, request):
@@ -42,73 +98,103 @@ class AddToCartView(CartBaseView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
-        product_id = data['product_id']
-        quantity = data['quantity']
 
         try:
-            product = get_object_or_404(Product, id=product_id) # Đã sửa lại
-            
-            with transaction.atomic():
-                cart, _ = Cart.objects.select_for_update().get_or_create(user=request.user)
-                
-                item_exists = False
-                for item in cart.items:
-                    if item['product_id'] == product.id:
-                        updated_quantity = item['quantity'] + quantity
-                        if updated_quantity > CartSettings.MAX_QUANTITY_PER_ITEM:
-                            return Response({
-                                "status": "error",
-                                "message": _("Total quantity cannot exceed %(max)s") % {
-                                    "max": CartSettings.MAX_QUANTITY_PER_ITEM
-                                }
-                            }, status=status.HTTP_400_BAD_REQUEST)
-                        item['quantity'] = updated_quantity
-                        item_exists = True
-                        break
-
-                if not item_exists:
-                    new_item = {
-                        "product_id": product.id,
-                        "quantity": quantity,
-                        "price": str(product.price),
-                        "name": product.name,
-                        "image": product.first_image_url  # Đã sửa lại
-                    }
-                    cart.items.append(new_item)
-
-                cart.save()
-
-                return Response({
-                    "status": "success",
-                    "cart_item_count": len(cart.items),
-                    "cart_total": calculate_cart_total(cart.items)
-                })
-
+            product = get_object_or_404(Product, id=data['product_id']) # Đã sửa lại
+
+            result = self.apply_operations(request, [{
+                "op": CartOperation.ADD.value,
+                "product_id": product.id,
+                "quantity": data['quantity'],
+            }])
+        except CartOperationError as e:
+            return Response({
+                "status": "error",
+                "message": e.message
+            }, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 "status": "error",
                 "message": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        if isinstance(result, Response):
+            return result
+        cart, _lines = result
+        return self.with_version(Response({
+            "status": "success",
+            **cart.get_summary(),
+            "version": cart.version
+        }), cart)
+
 
 class GetCartView(CartBaseView):
+    """
+    The cart as stored. With ``?refresh=1`` every line is first repriced
+    against the catalog and live flash sales; each line then also
+    carries its price and stock deltas.
+    """
+
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        return Response({
+        try:
+            return self.get_cart(request)
+        except Cart.DoesNotExist:
+            # Reading never creates a cart; the first write does.
+            return self.with_version(Response({
+                "status": "success",
+                "items": [],
+                "total": Decimal('0.00'),
+                "version": 0
+            }), Cart(user=request.user))
+
+    def get_cart(self, request):
+        if request.query_params.get('refresh') not in ('1', 'true'):
+            cart, items = CartService.read(request.user, create=False)
+            return self.with_version(Response({
+                "status": "success",
+                "items": [item.to_dict() for item in items],
+                "total": cart.subtotal,
+                "version": cart.version
+            }), cart)
+
+        try:
+            cart, items, report = CartService.refresh(request.user)
+        except CartVersionConflict as e:
+            return self.with_version(Response({
+                "status": "error",
+                "message": _("Cart is being modified, please retry"),
+                "version": e.cart.version
+            }, status=status.HTTP_409_CONFLICT), e.cart)
+
+        lines = [{**item.to_dict(), **report[item.product_id]} for item in items]
+        return self.with_version(Response({
             "status": "success",
-            "items": cart.items,
-            "total": calculate_cart_total(cart.items)
-        })
+            "items": lines,
+            "total": cart.subtotal,
+            "effective_total": sum(
+                (Decimal(line["effective_price"]) * line["quantity"]
+                 for line in lines if line["available"]),
+                Decimal('0.00'),
+            ),
+            "changed": any(
+                Decimal(line["price_delta"]) or line["stock_shortfall"] for line in lines
+            ),
+            "version": cart.version
+        }), cart)
 
 
 class GetCartSummaryView(CartBaseView):
     def get(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user)
-        return Response({
+        # Stored numbers only; no cart is created just to be polled.
+        item_count, subtotal, version = CartService.summary(request.user)
+        response = Response({
             "status": "success",
-            "cart_item_count": len(cart.items),
-            "cart_total": calculate_cart_total(cart.items)
+            "cart_item_count": item_count,
+            "cart_total": subtotal,
+            "version": version
         })
+        response.headers['ETag'] = f'"{version}"'
+        return response
 
 
 class UpdateCartItemView(CartBaseView):
@@ -121,45 +207,33 @@ class UpdateCartItemView(CartBaseView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         data = serializer.validated_data
-        product_id = data['product_id']
-        new_quantity = data['quantity']
 
         try:
-            with transaction.atomic():
-                cart = Cart.objects.select_for_update().get(user=request.user)
-                
-                item_updated = False
-                for item in cart.items:
-                    if item['product_id'] == product_id:
-                        item['quantity'] = new_quantity
-                        item_updated = True
-                        break
-
-                if not item_updated:
-                    return Response({
-                        "status": "error",
-                        "message": _("Product not found in cart")
-                    }, status=status.HTTP_404_NOT_FOUND)
-
-                cart.save()
-
-                return Response({
-                    "status": "success",
-                    "cart_item_count": len(cart.items),
-                    "cart_total": calculate_cart_total(cart.items)
-                })
-
-        except Cart.DoesNotExist:
+            result = self.apply_operations(request, [{
+                "op": CartOperation.SET.value,
+                "product_id": data['product_id'],
+                "quantity": data['quantity'],
+            }], create=False)
+        except CartOperationError as e:
             return Response({
                 "status": "error",
-                "message": _("Cart not found")
-            }, status=status.HTTP_404_NOT_FOUND)
+                "message": e.message
+            }, status=status.HTTP_404_NOT_FOUND if e.not_found else status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({
                 "status": "error",
                 "message": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        if isinstance(result, Response):
+            return result
+        cart, _lines = result
+        return self.with_version(Response({
+            "status": "success",
+            **cart.get_summary(),
+            "version": cart.version
+        }), cart)
+
 
 class RemoveFromCartView(CartBaseView):
     def post(self, request):
@@ -171,34 +245,15 @@ class RemoveFromCartView(CartBaseView):
                 "message": serializer.errors
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        product_id = serializer.validated_data['product_id']
-
         try:
-            with transaction.atomic():
-                cart = Cart.objects.select_for_update().get(user=request.user)
-                initial_count = len(cart.items)
-                
-                cart.items = [item for item in cart.items if item['product_id'] != product_id]
-                
-                if len(cart.items) == initial_count:
-                    return Response({
-                        "status": "error",
-                        "message": _("Product not found in cart")
-                    }, status=status.HTTP_404_NOT_FOUND)
-
-                cart.save()
-
-                return Response({
-                    "status": "success",
-                    "cart_item_count": len(cart.items),
-                    "cart_total": calculate_cart_total(cart.items),
-                    "message": _("Product removed from cart")
-                })
-
-        except Cart.DoesNotExist:
+            result = self.apply_operations(request, [{
+                "op": CartOperation.REMOVE.value,
+                "product_id": serializer.validated_data['product_id'],
+            }], create=False)
+        except CartOperationError as e:
             return Response({
                 "status": "error",
-                "message": _("Cart not found")
+                "message": e.message
             }, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({
@@ -206,35 +261,80 @@ class RemoveFromCartView(CartBaseView):
                 "message": str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        if isinstance(result, Response):
+            return result
+        cart, _lines = result
+        return self.with_version(Response({
+            "status": "success",
+            **cart.get_summary(),
+            "version": cart.version,
+            "message": _("Product removed from cart")
+        }), cart)
+
 class ClearCartView(CartBaseView):
     def post(self, request):
         try:
-            with transaction.atomic():
-                cart = Cart.objects.select_for_update().get(user=request.user)
+            result = self.apply_operations(
+                request, [{"op": CartOperation.CLEAR.value}], create=False,
+            )
+        except CartOperationError as e:
+            return Response({
+                "status": "error",
+                "message": e.message
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({
+                "status": "error",
+                "message": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-                if not cart.items:
-                    return Response({
-                        "status": "error",
-                        "message": _("Cart is already empty")
-                    }, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(result, Response):
+            return result
+        cart, _lines = result
+        return self.with_version(Response({
+            "status": "success",
+            "message": _("Cart has been cleared"),
+            "cart_item_count": 0,
+            "cart_total": 0,
+            "version": cart.version
+        }), cart)
 
-                cart.items = []  # Xóa hết item
-                cart.save()
 
-                return Response({
-                    "status": "success",
-                    "message": _("Cart has been cleared"),
-                    "cart_item_count": 0,
-                    "cart_total": 0
-                })
+class BatchCartView(CartBaseView):
+    """
+    Apply an ordered list of add / set / remove / clear operations atomically.
 
-        except Cart.DoesNotExist:
+    Body: {"operations": [{"op": "add", "product_id": 1, "quantity": 2},
+                          {"op": "set", "product_id": 2, "quantity": 1},
+                          {"op": "remove", "product_id": 3}]}
+
+    Either every operation is applied or none is; the response carries
+    the resulting cart.
+    """
+
+    def post(self, request):
+        serializer = BatchCartSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response({
                 "status": "error",
-                "message": _("Cart not found")
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
+                "message": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = self.apply_operations(request, serializer.validated_data['operations'])
+        except CartOperationError as e:
             return Response({
                 "status": "error",
-                "message": str(e)
+                "message": e.message,
+                "operation": e.index
             }, status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(result, Response):
+            return result
+        cart, items = result
+        return self.with_version(Response({
+            "status": "success",
+            "items": [item.to_dict() for item in items],
+            **cart.get_summary(),
+            "version": cart.version
+        }), cart)
@@ -84,7 +84,7 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedUserJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAdminUser',
@@ -278,6 +278,56 @@ EMAIL_HOST_USER = os.getenv('EMAIL_DEFAULT')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_DEFAULT')
 
+# Cache: Redis when CACHE_REDIS_URL is set, per-process memory otherwise
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'shop',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Seconds an authenticated user is served from cache instead of the users
+# table; saving the user invalidates it at once. 0 disables the cache.
+# Needs the shared Redis cache: with per-process memory an invalidation
+# only reaches one worker, so a deactivated user would keep signing in on
+# the others. Off by default without CACHE_REDIS_URL.
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60 if CACHE_REDIS_URL else 0))
+
+# Seconds a cached category list / product detail payload may be served
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 300))
+
+# Hot cart store: carts in Redis hashes, written behind to Postgres, when
+# CART_REDIS_URL is set; Postgres only otherwise
+CART_REDIS_URL = os.environ.get('CART_REDIS_URL')
+CART_STORE = {
+    'BACKEND': 'cart.store.RedisCartStore',
+    'LOCATION': CART_REDIS_URL,
+} if CART_REDIS_URL else None
+# Seconds an untouched cart stays hot; write-behind runs long before this
+CART_STORE_TIMEOUT = int(os.getenv('CART_STORE_TIMEOUT', 7 * 24 * 3600))
+CART_FLUSH_INTERVAL = int(os.getenv('CART_FLUSH_INTERVAL', 60))
+# Carts untouched this long are deleted by the nightly compaction
+CART_EXPIRY_DAYS = int(os.getenv('CART_EXPIRY_DAYS', 30))
+CART_COMPACTION_HOUR = int(os.getenv('CART_COMPACTION_HOUR', 3))
+
+# Checkout takes ordered units out of Product.stock_quantity and refuses
+# orders it cannot cover. Off until every sellable product carries a real
+# count: stock_quantity defaults to 0 and the admin UI does not edit it.
+STOCK_RESERVATION_ENABLED = os.environ.get('STOCK_RESERVATION_ENABLED', 'False').lower() == 'true'
+
+# Seconds an order Idempotency-Key is remembered; a retry with the key
+# inside this window gets the original order back
+ORDER_IDEMPOTENCY_TTL = int(os.getenv('ORDER_IDEMPOTENCY_TTL', 24 * 3600))
+
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND')
 CELERY_RESULT_SERIALIZER = 'json'
@@ -299,6 +349,18 @@ CELERY_BEAT_SCHEDULE = {
                             minute=REPORT_MINUTE
                             ),
     },
+    'flush-dirty-carts': {
+        'task': 'cart.tasks.flush_dirty_carts',
+        'schedule': CART_FLUSH_INTERVAL,
+    },
+    'compact-carts-daily': {
+        'task': 'cart.tasks.compact_carts',
+        'schedule': crontab(hour=CART_COMPACTION_HOUR, minute=0),
+    },
+    'purge-order-idempotency-keys': {
+        'task': 'orders.tasks.purge_idempotency_keys',
+        'schedule': crontab(minute=30),
+    },
 }
 
 LOGGING = {
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+USER_VERSION_KEY = 'auth:user:{pk}:version'
+USER_KEY = 'auth:user:{pk}:{version}'
+
+
+def _user_version(pk):
+    version = cache.get(USER_VERSION_KEY.format(pk=pk))
+    if version is None:
+        cache.add(USER_VERSION_KEY.format(pk=pk), 1, timeout=None)
+        version = cache.get(USER_VERSION_KEY.format(pk=pk), 1)
+    return version
+
+
+def _bump_user_version(pk):
+    try:
+        cache.incr(USER_VERSION_KEY.format(pk=pk))
+    except ValueError:
+        cache.add(USER_VERSION_KEY.format(pk=pk), 2, timeout=None)
+
+
+def invalidate_user(pk):
+    """
+    Drop the cached copy of a user now and again once the surrounding
+    transaction commits, so a request that re-cached the old row in
+    between is evicted too.
+    """
+    _bump_user_version(pk)
+    transaction.on_commit(lambda: _bump_user_version(pk))
+
+
+class CachedUserJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from a short-lived
+    cache instead of a query per request.
+
+    Entries are keyed by user id and a per-user version, and
+    ``invalidate_user`` bumps the version whenever the user row is saved
+    (profile edits, deactivation, reactivation). The cached user is
+    rebuilt without its password, which stays deferred: saving it writes
+    only the cached fields. Entries map attnames to values, and one whose
+    fields no longer match the model (cached before a migration) is
+    treated as a miss. Only safe on a cache shared by all workers, see
+    ``AUTH_USER_CACHE_TIMEOUT``.
+    """
+
+    def get_user(self, validated_token):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if timeout <= 0 or api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the password hash, which is not cached.
+            return super().get_user(validated_token)
+
+        try:
+            pk = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        key = USER_KEY.format(pk=pk, version=_user_version(pk))
+        values = cache.get(key)
+        fields = [
+            field.attname for field in self.user_model._meta.concrete_fields
+            if field.attname != 'password'
+        ]
+        if isinstance(values, dict) and values.keys() == set(fields):
+            return self.user_model.from_db(
+                router.db_for_read(self.user_model), fields, [values[field] for field in fields],
+            )
+
+        user = super().get_user(validated_token)
+        cache.set(key, {field: getattr(user, field) for field in fields}, timeout)
+        return user
+
+
+class RequestCachedJWTAuthentication(CachedUserJWTAuthentication):
+    """
+    JWTAuthentication that verifies a request's token at most once.
+
+    The ``(user, token)`` pair is kept on the underlying Django request,
+    so ``json_jwt_required`` and DRF's authentication step share one
+    token verification and one user lookup.
+    """
+
+    cache_attr = '_jwt_authentication'
+
+    def authenticate(self, request):
+        django_request = getattr(request, '_request', request)
+        if hasattr(django_request, self.cache_attr):
+            return getattr(django_request, self.cache_attr)
+
+        result = super().authenticate(request)
+        setattr(django_request, self.cache_attr, result)
+        return result
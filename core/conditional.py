@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the string form of ``parts``."""
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode('utf-8'),
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def latest(*values):
+    """The most recent of the given datetimes, ignoring ``None``."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for read-only API views.
+
+    Subclasses implement ``get_validators`` and return ``(etag_parts,
+    last_modified)``, or ``None`` to skip validation (e.g. when the
+    object does not exist). The parts should be derived from stored
+    data only, so every worker builds the same tag, and should be cheap
+    to get: ``products.conditional`` caches them under the catalog
+    versions. A request whose
+    If-None-Match / If-Modified-Since still matches is answered with 304
+    before the queryset is serialized.
+
+    Responses carry ``Cache-Control: no-cache`` so browsers always
+    revalidate instead of applying heuristic freshness.
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return super().get(request, *args, **kwargs)
+
+        etag_parts, last_modified = validators
+        etag = make_etag(request.get_full_path(), *etag_parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp,
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response.headers['ETag'] = etag
+        if timestamp is not None:
+            response.headers['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, no_cache=True)
+        return response
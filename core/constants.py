@@ -27,6 +27,14 @@ class ReviewSettings:
     N_MOST_RECENT_REVIEWS = 5
 
 
+class SearchSettings:
+    """Constants for product search"""
+    INSTANT_DEFAULT_LIMIT = 10
+    INSTANT_MAX_LIMIT = 20
+    PREFIX_CACHE_SIZE = 512
+    PREFIX_CACHE_TTL_SECONDS = 30
+
+
 class PaginationSettings:
     """Constants for pagination"""
     DEFAULT_PAGE_SIZE = 20
@@ -65,6 +73,22 @@ class OrderStatus(str, Enum):
 class CartSettings:
     """Constants related to cart behavior"""
     MAX_QUANTITY_PER_ITEM = 100
+    MAX_BATCH_OPERATIONS = 50
+    MAX_WRITE_RETRIES = 3
+    FLUSH_BATCH_SIZE = 500
+    COMPACTION_BATCH_SIZE = 1000
+
+
+class CartOperation(str, Enum):
+    """Operations accepted by the batch cart endpoint"""
+    ADD = 'add'
+    SET = 'set'
+    REMOVE = 'remove'
+    CLEAR = 'clear'
+
+    @classmethod
+    def choices(cls):
+        return [(op.value, _(op.name.title())) for op in cls]
 
 class CancelReason(str, Enum):
     """Cancel order reasons enumeration"""
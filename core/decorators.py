@@ -1,15 +1,16 @@
 from functools import wraps
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from core.authentication import RequestCachedJWTAuthentication
+
 
 def json_jwt_required(view_func):
     """Decorator kiểm tra JWT auth và trả JSON 403 nếu không hợp lệ"""
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        jwt_authenticator = JWTAuthentication()
+        jwt_authenticator = RequestCachedJWTAuthentication()
         try:
             result = jwt_authenticator.authenticate(request)
             if result is None:
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param
+from rest_framework.utils.urls import replace_query_param
+
+from core.constants import PaginationSettings
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination that follows the ordering of the queryset.
+
+    The last ordering field is made unique by appending the primary key,
+    and pages are fetched with ``WHERE (f1, ..., pk) > (v1, ..., id)``
+    style filters instead of OFFSET, so page 500 costs the same as page 1
+    when an index matches the ordering. The total count is only computed
+    when the client asks for it with ``include_count=true``.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = PaginationSettings.MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'include_count'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in {'true', '1'}:
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            position = self._to_python(queryset, cursor['position'])
+            queryset = queryset.filter(self._seek_filter(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [
+            field for field in queryset.query.order_by if isinstance(field, str)
+        ] or ['-pk']
+        ordering = ['-pk' if f == '-id' else 'pk' if f == 'id' else f for f in ordering]
+        if ordering[-1].lstrip('-') != 'pk':
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return ordering
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict()
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.get_next_link()
+        payload['previous'] = self.get_previous_link()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # Cursor encoding
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii').rstrip('=')
+
+    def _link(self, obj, reverse):
+        position = [
+            self._serialize(self._value(obj, field.lstrip('-')))
+            for field in self.ordering
+        ]
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(position, reverse),
+        )
+
+    # Seek filters
+
+    @staticmethod
+    def _reversed(ordering):
+        return [f[1:] if f.startswith('-') else f'-{f}' for f in ordering]
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        """
+        Rows strictly after ``position`` in ``ordering``.
+
+        Expands the row comparison into OR-ed equality prefixes and adds a
+        non-strict bound on the leading column so the planner can start
+        the index scan at the cursor instead of filtering from the top.
+        """
+        names = [f.lstrip('-') for f in ordering]
+        lookups = ['lt' if f.startswith('-') else 'gt' for f in ordering]
+
+        after = Q()
+        for i, (name, lookup) in enumerate(zip(names, lookups)):
+            step = Q(**{f'{name}__{lookup}': position[i]})
+            for prev_name, prev_value in zip(names[:i], position[:i]):
+                step &= Q(**{prev_name: prev_value})
+            after |= step
+
+        leading = Q(**{f'{names[0]}__{lookups[0]}e': position[0]})
+        return leading & after
+
+    @staticmethod
+    def _value(obj, name):
+        return obj.pk if name == 'pk' else getattr(obj, name)
+
+    @staticmethod
+    def _serialize(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, (int, float, str)) or value is None:
+            return value
+        return str(value)
+
+    def _to_python(self, queryset, position):
+        values = []
+        for field, raw in zip(self.ordering, position):
+            name = field.lstrip('-')
+            if name in queryset.query.annotations:
+                output_field = queryset.query.annotations[name].output_field
+            elif name == 'pk':
+                output_field = queryset.model._meta.pk
+            else:
+                output_field = queryset.model._meta.get_field(name)
+            try:
+                values.append(output_field.to_python(raw))
+            except (TypeError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
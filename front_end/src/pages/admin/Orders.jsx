@@ -390,8 +390,8 @@ export function Orders() {
                         {Number(order.discount_amount || 0) > 0 && (
                           <div className="text-xs text-emerald-700">
                             −{formatCurrency(order.discount_amount)}
-                            {order.coupon_info?.code
-                              ? ` (${order.coupon_info.code})`
+                            {order.coupon_code
+                              ? ` (${order.coupon_code})`
                               : ""}
                           </div>
                         )}
@@ -576,8 +576,8 @@ export function Orders() {
                     <div className="flex justify-between items-center mt-2 text-sm text-emerald-700">
                       <span>
                         Discount{" "}
-                        {selectedOrder.coupon_info?.code
-                          ? `(${selectedOrder.coupon_info.code})`
+                        {selectedOrder.coupon_code
+                          ? `(${selectedOrder.coupon_code})`
                           : ""}
                         :
                       </span>
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:23
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, help_text="Whether the order's units are currently taken out of product stock"),
+        ),
+    ]
@@ -90,6 +90,23 @@ class Coupon(BaseModel):
         
         return final_amount, discount_amount
 
+    def redeem(self):
+        """
+        Count one use of the coupon with a single conditional UPDATE that
+        only matches while it is unexpired and below usage_limit, so
+        concurrent orders can never overspend it. Returns False if the
+        coupon is no longer valid.
+        """
+        redeemed = Coupon.objects.filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gte=timezone.now()),
+            models.Q(usage_limit__isnull=True) | models.Q(usage_limit=0)
+            | models.Q(times_used__lt=models.F('usage_limit')),
+            pk=self.pk,
+        ).update(times_used=models.F('times_used') + 1, updated_at=timezone.now())
+        if redeemed:
+            self.times_used += 1
+        return bool(redeemed)
+
 
 class Order(BaseModel):
     user = models.ForeignKey(
@@ -154,6 +171,10 @@ class Order(BaseModel):
         default=OrderStatus.PENDING.value,
     )
     ordered_at = models.DateTimeField(auto_now_add=True)
+    stock_reserved = models.BooleanField(
+        default=False,
+        help_text=_("Whether the order's units are currently taken out of product stock")
+    )
 
     class Meta:
         db_table = 'orders'
@@ -196,6 +217,36 @@ class OrderItem(BaseModel):
                          name='idx_order_items_product_id'),
         ]
 
+
+class OrderIdempotencyKey(BaseModel):
+    """An ``Idempotency-Key`` a user placed an order with, kept for ORDER_IDEMPOTENCY_TTL"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='order_idempotency_keys',
+    )
+    key = models.CharField(max_length=FieldLengths.DEFAULT)
+    request_hash = models.CharField(
+        max_length=64,
+        help_text=_("SHA-256 of the request body the key was first used with")
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='idempotency_keys',
+    )
+
+    class Meta:
+        db_table = 'order_idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='uniq_order_idempotency_user_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idx_order_idem_created_at'),
+        ]
+
+
 class FlashSale(BaseModel):
     name = models.CharField(
         max_length=FieldLengths.DEFAULT,
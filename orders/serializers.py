@@ -1,8 +1,11 @@
 # orders/serializers.py
 
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from .models import Order, OrderItem, Coupon
+from .services.stock_service import StockService
 from core.constants import OrderStatus, CancelReason, FieldLengths, DecimalSettings, FlashSaleSettings, FlashSaleStatus, RejectReason
 from .models import FlashSale
 from products.serializers import ProductInstantSerializer
@@ -138,6 +141,30 @@ class OrderSerializer(serializers.ModelSerializer):
             'coupon_info',
         )
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load a page of orders in three queries whatever its size: the
+        orders with their user and coupon, and their items joined to the
+        product columns the items show.
+        """
+        order_items = OrderItem.objects.select_related('product').only(
+            'order', 'quantity', 'price_at_order', 'product__name', 'product__image_urls',
+        ).order_by('id')
+        return queryset.select_related('user', 'coupon').prefetch_related(
+            Prefetch('items', queryset=order_items),
+        )
+
+    def validate_order_status(self, value):
+        # Their stock went back on cancel/reject, so they stay closed.
+        if (
+            self.instance is not None
+            and self.instance.order_status in StockService.RESTOCK_STATUSES
+            and value != self.instance.order_status
+        ):
+            raise serializers.ValidationError(_("Cancelled or rejected orders cannot change status"))
+        return value
+
     def get_can_cancel(self, obj):  
         return obj.order_status == OrderStatus.PENDING.value
 
@@ -153,6 +180,71 @@ class OrderSerializer(serializers.ModelSerializer):
         validated_data.pop("coupon_code", None)
         return super().create(validated_data)
 
+    def update(self, instance, validated_data):
+        validated_data.pop("coupon_code", None)
+        with transaction.atomic():
+            # Cancelling or rejecting an order returns its units to stock.
+            if validated_data.get('order_status') in StockService.RESTOCK_STATUSES:
+                StockService.restore(instance)
+            return super().update(instance, validated_data)
+
+
+class OrderListItemSerializer(serializers.ModelSerializer):
+    product_name      = serializers.ReadOnlyField(source='product.name')
+    product_image_url = serializers.ReadOnlyField(source='product.first_image_url')
+
+    class Meta:
+        model = OrderItem
+        fields = (
+            'product_name',
+            'product_image_url',
+            'quantity',
+            'price_at_order',
+        )
+        read_only_fields = fields
+
+
+class OrderListSerializer(serializers.ModelSerializer):
+    """
+    Flat read-only order rows for order lists, over
+    OrderSerializer.setup_eager_loading querysets: the coupon is shown by
+    its code and items carry only what the lists display.
+    """
+    items = OrderListItemSerializer(many=True, read_only=True)
+    can_cancel = serializers.SerializerMethodField()
+    user_email = serializers.SerializerMethodField()
+    coupon_code = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = (
+            'id',
+            'customer_name',
+            'user_email',
+            'customer_phone',
+            'customer_address',
+            'total_amount',
+            'discount_amount',
+            'final_amount',
+            'payment_method',
+            'order_status',
+            'ordered_at',
+            'items',
+            'cancel_reason',
+            'can_cancel',
+            'coupon_code',
+        )
+        read_only_fields = fields
+
+    def get_can_cancel(self, obj):
+        return obj.order_status == OrderStatus.PENDING.value
+
+    def get_user_email(self, obj):
+        return obj.user.email if obj.user else None
+
+    def get_coupon_code(self, obj):
+        return obj.coupon.code if obj.coupon else None
+
 
 class FlashSaleSerializer(serializers.ModelSerializer):
     products = serializers.PrimaryKeyRelatedField(
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import OrderIdempotencyKey
+
+
+class OrderIdempotencyService:
+    """Remember order requests by ``Idempotency-Key`` so retries replay the first order"""
+
+    HEADER = 'Idempotency-Key'
+    REPLAYED_HEADER = 'Idempotent-Replayed'
+
+    @staticmethod
+    def request_hash(data):
+        payload = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def expired_before():
+        return timezone.now() - timedelta(seconds=settings.ORDER_IDEMPOTENCY_TTL)
+
+    @staticmethod
+    def claim(user, key, request_hash):
+        """
+        Record ``key`` for ``user`` inside the order transaction.
+
+        Returns ``(record, None)`` if this request owns the key, or
+        ``(None, previous)`` with the record of the order the key already
+        placed. A concurrent duplicate blocks on the unique index until
+        the first request's transaction ends: it then replays that order,
+        or takes the key over if the first checkout rolled back.
+        """
+        OrderIdempotencyKey.objects.filter(
+            user=user, key=key, created_at__lt=OrderIdempotencyService.expired_before(),
+        ).delete()
+        try:
+            with transaction.atomic():
+                record = OrderIdempotencyKey.objects.create(user=user, key=key, request_hash=request_hash)
+        except IntegrityError:
+            return None, OrderIdempotencyKey.objects.get(user=user, key=key)
+        return record, None
+
+    @staticmethod
+    def complete(record, order):
+        record.order = order
+        record.save(update_fields=['order', 'updated_at'])
+
+    @staticmethod
+    def purge_expired():
+        """Delete keys past ORDER_IDEMPOTENCY_TTL; returns how many"""
+        deleted, _rows = OrderIdempotencyKey.objects.filter(
+            created_at__lt=OrderIdempotencyService.expired_before(),
+        ).delete()
+        return deleted
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from decimal import Decimal
+
+from orders.models import OrderItem
+from products.models import Product
+from products.pricing import FlashSalePriceResolver
+
+
+class CheckoutPricingService:
+    """Price cart lines for an order with a fixed number of queries"""
+
+    @staticmethod
+    def price_lines(cart_items, now=None):
+        """
+        Resolve current prices and the best live flash sale for every line
+        with one product query and one flash-sale query.
+
+        Returns ``(order_items, total, unavailable)``: unsaved OrderItems
+        without an order, the order total, and the ids of products that
+        no longer exist.
+        """
+        products = Product.objects.in_bulk([item.product_id for item in cart_items])
+        resolver = FlashSalePriceResolver(now=now)
+        resolver.load(products.values())
+
+        order_items = []
+        unavailable = []
+        total = Decimal('0.00')
+        for cart_item in cart_items:
+            product = products.get(cart_item.product_id)
+            if product is None:
+                unavailable.append(cart_item.product_id)
+                continue
+            price = resolver.get_effective_price(product)
+            total += price * cart_item.quantity
+            order_items.append(OrderItem(
+                product=product,
+                quantity=cart_item.quantity,
+                price_at_order=price,
+            ))
+        return order_items, total, unavailable
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Now
+
+from core.constants import OrderStatus
+from orders.models import Order, OrderItem
+from products import cache as catalog_cache
+from products.models import Product
+from products.search import instant_search_cache
+
+
+class InsufficientStock(Exception):
+    """Raised when some products of an order are unavailable or have too few units left"""
+
+    def __init__(self, product_ids):
+        super().__init__(product_ids)
+        self.product_ids = product_ids
+
+
+class StockService:
+    """Reserve and return product stock for orders"""
+
+    RESTOCK_STATUSES = (OrderStatus.CANCELLED.value, OrderStatus.REJECTED.value)
+
+    @staticmethod
+    def _locked(quantities):
+        """
+        Products of ``quantities`` with their rows locked in product-id
+        order, so concurrent orders over the same products wait on each
+        other instead of deadlocking.
+        """
+        locked = (
+            Product.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .order_by('pk')
+            .values('pk')
+        )
+        return Product.objects.filter(pk__in=locked)
+
+    @staticmethod
+    def _per_product(quantities):
+        return Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def _invalidate(product_ids, availability_changed):
+        for pk in product_ids:
+            catalog_cache.invalidate_product(pk)
+        if availability_changed:
+            transaction.on_commit(instant_search_cache.clear)
+
+    @staticmethod
+    def reserve(order, order_items):
+        """
+        Take the units of ``order_items`` out of stock with one
+        conditional UPDATE, marking products that reach zero as out of
+        stock, and flag ``order`` as holding them. Must run inside the
+        order's transaction.
+
+        Deleted and out-of-stock products are refused either way. Without
+        ``settings.STOCK_RESERVATION_ENABLED`` that is all, and stock
+        counts are left untouched.
+
+        Raises InsufficientStock with the ids of the refused products, in
+        which case nothing is reserved once the transaction rolls back.
+        """
+        quantities = {}
+        for item in order_items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        if not quantities:
+            return
+
+        unavailable = Q(is_deleted=True) | Q(is_in_stock=False)
+        if not settings.STOCK_RESERVATION_ENABLED:
+            refused = Product.objects.filter(unavailable, pk__in=quantities)
+            refused = sorted(refused.values_list('pk', flat=True))
+            if refused:
+                raise InsufficientStock(refused)
+            return
+
+        needed = StockService._per_product(quantities)
+        reserved = StockService._locked(quantities).filter(
+            is_deleted=False, is_in_stock=True, stock_quantity__gte=needed,
+        ).update(
+            stock_quantity=F('stock_quantity') - needed,
+            is_in_stock=Case(
+                When(stock_quantity__gt=needed, then=F('is_in_stock')),
+                default=Value(False),
+            ),
+            updated_at=Now(),
+        )
+        if reserved != len(quantities):
+            refused = Product.objects.filter(unavailable | Q(stock_quantity__lt=needed), pk__in=quantities)
+            raise InsufficientStock(sorted(refused.values_list('pk', flat=True)))
+
+        Order.objects.filter(pk=order.pk).update(stock_reserved=True)
+        order.stock_reserved = True
+
+        sold_out = Product.objects.filter(pk__in=quantities, stock_quantity=0).exists()
+        StockService._invalidate(quantities, sold_out)
+
+    @staticmethod
+    def restore(order):
+        """
+        Put the units of ``order`` back into stock if it still holds them.
+        The reservation is released with a conditional UPDATE on
+        ``stock_reserved``, so an order is restocked at most once, even
+        when cancelled and rejected concurrently, and orders that never
+        reserved stock are left alone.
+        """
+        with transaction.atomic():
+            released = Order.objects.filter(pk=order.pk, stock_reserved=True).update(
+                stock_reserved=False, updated_at=Now(),
+            )
+            # Keep a later save of ``order`` from writing a stale flag back.
+            order.stock_reserved = False
+            if not released:
+                return False
+
+            quantities = {}
+            for product_id, quantity in OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'):
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            if not quantities:
+                return True
+
+            returned = StockService._per_product(quantities)
+            StockService._locked(quantities).update(
+                stock_quantity=F('stock_quantity') + returned,
+                is_in_stock=Case(
+                    When(stock_quantity=0, then=Value(True)),
+                    default=F('is_in_stock'),
+                ),
+                updated_at=Now(),
+            )
+            StockService._invalidate(quantities, True)
+        return True
@@ -1,3 +1,4 @@
+from django.db.models.signals import m2m_changed
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.db import transaction
@@ -6,6 +7,7 @@ from django.utils.formats import date_format
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
+from .models import FlashSale
 from .models import Order
 from .services.email_service import OrderEmailService
 from core.constants import OrderStatus
@@ -44,6 +46,20 @@ def order_status_change_handler(sender, instance, created, update_fields=None, *
         transaction.on_commit(lambda: safe_send(send_order_rejected_email, instance))
 
 
+@receiver(m2m_changed, sender=FlashSale.products.through)
+def touch_flash_sale_on_products_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Adding or removing products is an edit of the sale: bump updated_at."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        sales = FlashSale.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        sales = FlashSale.objects.filter(products=instance)
+    else:
+        sales = FlashSale.objects.filter(pk__in=pk_set or ())
+    sales.update(updated_at=timezone.now())
+
+
 def send_order_confirmation_email(order):
     """Send order confirmation email"""
     user_email = order.user.email if order.user else order.customer_email
@@ -5,6 +5,7 @@ from django.template.loader import render_to_string
 from django.utils import timezone
 from django.db.models import Sum
 from orders.models import Order
+from orders.services.idempotency_service import OrderIdempotencyService
 from django.conf import settings
 from datetime import datetime, timedelta, time
 from django.contrib.auth import get_user_model
@@ -64,3 +65,11 @@ def send_monthly_revenue_report():
         return f"Error sending email: {e}"
 
     return "Monthly revenue report sent successfully."
+
+
+@shared_task
+def purge_idempotency_keys():
+    """Hourly cleanup of order Idempotency-Keys past their TTL."""
+    deleted = OrderIdempotencyService.purge_expired()
+    logger.info("Purged %s expired order idempotency keys", deleted)
+    return deleted
@@ -1,15 +1,27 @@
 from __future__ import annotations
 
+import threading
 from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db import transaction
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from .models import Coupon, Order, FlashSale
+from cart.models import Cart
+from cart.models import CartItem
+from cart.services.cart_service import CartService
+from .models import Coupon, Order, OrderIdempotencyKey, OrderItem, FlashSale
+from .services.stock_service import InsufficientStock, StockService
+from .tasks import purge_idempotency_keys
 from products.models import Product, Category
-from core.constants import OrderStatus, PaymentMethod
+from core.constants import CancelReason, CartOperation, OrderStatus, PaymentMethod, RejectReason
 
 User = get_user_model()
 
@@ -123,6 +135,17 @@ class CouponModelTest(TestCase):
         
         self.assertEqual(self.valid_coupon.times_used, initial_usage + 1)
 
+    def test_coupon_redeem_stops_at_usage_limit(self):
+        """Redeeming counts a use until usage_limit, then refuses"""
+        self.assertTrue(self.valid_coupon.redeem())
+        self.valid_coupon.refresh_from_db()
+        self.assertEqual(self.valid_coupon.times_used, 1)
+        self.assertTrue(self.no_expiry_coupon.redeem())
+        self.assertFalse(self.limit_reached_coupon.redeem())
+        self.assertFalse(self.expired_coupon.redeem())
+        self.limit_reached_coupon.refresh_from_db()
+        self.assertEqual(self.limit_reached_coupon.times_used, 5)
+
 
 class CouponSerializerTest(TestCase):
     def setUp(self):
@@ -656,6 +679,22 @@ class FlashSaleListViewTest(TestCase):
         self.assertIn('discount_percent', flash_sale_data)
         self.assertIn('products_info', flash_sale_data)
 
+    def test_active_flash_sale_list_conditional_get(self):
+        """Active flash sales answer 304 until a listed product changes"""
+        from rest_framework.test import APIClient
+        client = APIClient()
+
+        first = client.get('/api/flash-sales/active/')
+        self.assertIn('ETag', first)
+        response = client.get('/api/flash-sales/active/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.product.price = Decimal("90.00")
+        self.product.save()
+        response = client.get('/api/flash-sales/active/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
     def test_flash_sale_product_list_view(self):
         """Test the flash sale product list API view"""
         from rest_framework.test import APIClient
@@ -873,3 +912,577 @@ class FlashSaleIntegrationTest(TestCase):
         product_data = response.data['products']
         self.assertEqual(product_data[0]['price'], '100.00')  # Original price
         # Sale price should be shown in products_info, not in main product data
+
+
+class OrderCheckoutTest(TestCase):
+    """Placing an order from the cart"""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(
+            email="checkout@example.com",
+            password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+        self.category = Category.objects.create(name="Checkout Category")
+        self.product1 = Product.objects.create(
+            name="Checkout Product 1",
+            price=Decimal("100.00"),
+            category=self.category,
+            is_in_stock=True,
+            stock_quantity=10
+        )
+        self.product2 = Product.objects.create(
+            name="Checkout Product 2",
+            price=Decimal("40.00"),
+            category=self.category,
+            is_in_stock=True,
+            stock_quantity=10
+        )
+        self.order_data = {
+            'customer_name': 'Checkout Customer',
+            'customer_phone': '1234567890',
+            'customer_address': 'Checkout Address',
+            'payment_method': PaymentMethod.COD.value,
+        }
+
+    def _add_to_cart(self, product, quantity):
+        response = self.client.post(
+            '/api/cart/add/',
+            {'product_id': product.id, 'quantity': quantity},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_checkout_orders_cart_and_empties_it(self):
+        """The order copies the cart lines and the cart is left empty"""
+        self._add_to_cart(self.product1, 2)
+        self._add_to_cart(self.product2, 1)
+
+        response = self.client.post('/api/orders/', self.order_data, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal("240.00"))
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'quantity')),
+            sorted([(self.product1.id, 2), (self.product2.id, 1)])
+        )
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.items.count(), 0)
+        self.assertEqual((cart.item_count, cart.subtotal), (0, Decimal("0.00")))
+
+    def _checkout_queries(self, products):
+        for product in products:
+            self._add_to_cart(product, 1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/orders/', self.order_data, format='json')
+        self.assertEqual(response.status_code, 201)
+        # The order transaction; serializing the response is not under the lock.
+        sql = [q['sql'] for q in ctx.captured_queries]
+        release = next(i for i, q in enumerate(sql) if q.startswith('RELEASE SAVEPOINT'))
+        return response, sql[:release], sql[release:]
+
+    def test_checkout_pricing_is_set_based(self):
+        """The locked checkout runs the same queries for 1 or 6 lines and applies the best live sale"""
+        products = [self.product1, self.product2] + [
+            Product.objects.create(
+                name=f"Bulk {i}", price=Decimal("10.00"), category=self.category, stock_quantity=10,
+            )
+            for i in range(4)
+        ]
+        now = timezone.now()
+        for percent in ("10.00", "50.00"):
+            sale = FlashSale.objects.create(
+                name=f"Sale {percent}", discount_percent=Decimal(percent),
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1),
+                is_active=True,
+            )
+            sale.products.add(self.product1)
+
+        _response, single, single_response = self._checkout_queries(products[:1])
+        response, many, many_response = self._checkout_queries(products)
+
+        self.assertEqual(len(single), len(many))
+        self.assertEqual(len(single_response), len(many_response))
+        self.assertEqual(len([q for q in many if '"flash_sales_products"' in q]), 1)
+        # 100 at 50% off + 40 + 4 * 10
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal("130.00"))
+
+    @override_settings(CART_STORE={'BACKEND': 'cart.store.MemoryCartStore'})
+    @mock.patch('cart.tasks.flush_cart.delay')
+    def test_checkout_flushes_hot_cart(self, flush_delay):
+        """With a hot cart store, checkout orders the hot lines and persists the empty cart"""
+        self._add_to_cart(self.product1, 1)
+        self._add_to_cart(self.product2, 2)
+        self.assertFalse(CartItem.objects.exists())
+
+        response = self.client.post('/api/orders/', self.order_data, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal("180.00"))
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.version), (0, 3))
+        summary = self.client.get('/api/cart/summary/')
+        self.assertEqual((summary.data['cart_item_count'], summary.data['version']), (0, 3))
+
+
+class CheckoutTestMixin:
+    """A customer and an admin client, and two products with little stock"""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(email="stock@example.com", password="testpass123")
+        self.admin = User.objects.create_superuser(email="stock-admin@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}'
+        )
+        self.admin_client = APIClient()
+        self.admin_client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}'
+        )
+        self.category = Category.objects.create(name="Stock Category")
+        self.product1 = Product.objects.create(
+            name="Stock Product 1", price=Decimal("100.00"), category=self.category, stock_quantity=3
+        )
+        self.product2 = Product.objects.create(
+            name="Stock Product 2", price=Decimal("40.00"), category=self.category, stock_quantity=5
+        )
+        self.order_data = {
+            'customer_name': 'Stock Customer',
+            'customer_phone': '1234567890',
+            'customer_address': 'Stock Address',
+            'payment_method': PaymentMethod.COD.value,
+        }
+
+    def _add_to_cart(self, *lines):
+        for product, quantity in lines:
+            response = self.client.post(
+                '/api/cart/add/', {'product_id': product.id, 'quantity': quantity}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def _checkout(self, *lines):
+        self._add_to_cart(*lines)
+        return self.client.post('/api/orders/', self.order_data, format='json')
+
+    def _stock(self, product):
+        product.refresh_from_db()
+        return product.stock_quantity, product.is_in_stock
+
+
+@override_settings(STOCK_RESERVATION_ENABLED=True)
+class OrderStockTest(CheckoutTestMixin, TestCase):
+    """Checkout reserves stock and coupon uses; cancelled and rejected orders return stock"""
+
+    def test_checkout_reserves_stock_and_marks_sold_out(self):
+        """Every line is taken out of stock; a product reaching zero is out of stock"""
+        response = self._checkout((self.product1, 3), (self.product2, 2))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._stock(self.product1), (0, False))
+        self.assertEqual(self._stock(self.product2), (3, True))
+
+    def test_checkout_rejects_unavailable_products(self):
+        """Deleted and out-of-stock products fail the order whatever their count"""
+        self._add_to_cart((self.product1, 1), (self.product2, 1))
+        Product.objects.filter(pk=self.product1.pk).update(is_in_stock=False)
+        Product.objects.filter(pk=self.product2.pk).update(is_deleted=True)
+
+        response = self.client.post('/api/orders/', self.order_data, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product_ids'], [self.product1.id, self.product2.id])
+        self.assertEqual(self._stock(self.product2), (5, True))
+
+    @override_settings(STOCK_RESERVATION_ENABLED=False)
+    def test_checkout_without_stock_reservation(self):
+        """With reservations switched off stock counts are ignored and kept"""
+        response = self._checkout((self.product1, 4))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Order.objects.get(pk=response.data['id']).stock_reserved)
+        self.assertEqual(self._stock(self.product1), (3, True))
+
+        Product.objects.filter(pk=self.product2.pk).update(is_in_stock=False)
+        response = self._checkout((self.product2, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product_ids'], [self.product2.id])
+
+    def test_checkout_rejects_oversold_order(self):
+        """One short line fails the whole order and reserves nothing"""
+        response = self._checkout((self.product1, 1), (self.product2, 6))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['product_ids'], [self.product2.id])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self._stock(self.product1), (3, True))
+        self.assertEqual(self._stock(self.product2), (5, True))
+        self.assertEqual(Cart.objects.get(user=self.user).items.count(), 2)
+
+    def test_cancel_restores_stock_once(self):
+        """A cancelled order returns its units, and cancelling again returns nothing"""
+        order_id = self._checkout((self.product1, 3), (self.product2, 1)).data['id']
+        data = {'order_status': OrderStatus.CANCELLED.value, 'cancel_reason': CancelReason.CHANGE_MIND.value}
+
+        response = self.client.patch(f'/api/orders/{order_id}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._stock(self.product1), (3, True))
+        self.assertEqual(self._stock(self.product2), (5, True))
+
+        order = Order.objects.get(pk=order_id)
+        self.assertFalse(order.stock_reserved)
+        self.assertFalse(StockService.restore(order))
+        self.assertEqual(self._stock(self.product1), (3, True))
+
+    def test_reject_restores_stock(self):
+        """An admin rejecting an order returns its units"""
+        order_id = self._checkout((self.product1, 2)).data['id']
+        self.assertEqual(self._stock(self.product1), (1, True))
+
+        response = self.admin_client.patch(f'/api/admin/orders/{order_id}/', {
+            'order_status': OrderStatus.REJECTED.value,
+            'reject_reason': RejectReason.OUT_OF_STOCK.value,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(pk=order_id).order_status, OrderStatus.REJECTED.value)
+        self.assertEqual(self._stock(self.product1), (3, True))
+
+    def test_rejected_order_cannot_be_reopened(self):
+        """A restocked order stays closed, so it can never be restocked twice"""
+        order_id = self._checkout((self.product1, 2)).data['id']
+        self.admin_client.patch(f'/api/admin/orders/{order_id}/', {
+            'order_status': OrderStatus.REJECTED.value,
+            'reject_reason': RejectReason.OUT_OF_STOCK.value,
+        }, format='json')
+
+        response = self.admin_client.patch(
+            f'/api/admin/orders/{order_id}/', {'order_status': OrderStatus.PENDING.value}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(pk=order_id).order_status, OrderStatus.REJECTED.value)
+        self.assertEqual(self._stock(self.product1), (3, True))
+
+    def test_cancel_order_without_reservation_keeps_stock(self):
+        """Orders that never reserved stock, such as ones placed before reservations, return nothing"""
+        order_id = self._checkout((self.product1, 2)).data['id']
+        Order.objects.filter(pk=order_id).update(stock_reserved=False)
+        data = {'order_status': OrderStatus.CANCELLED.value, 'cancel_reason': CancelReason.CHANGE_MIND.value}
+
+        response = self.client.patch(f'/api/orders/{order_id}/', data, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._stock(self.product1), (1, True))
+
+    def test_other_status_changes_keep_stock(self):
+        """Confirming an order does not touch stock"""
+        order_id = self._checkout((self.product1, 2)).data['id']
+
+        response = self.admin_client.patch(
+            f'/api/admin/orders/{order_id}/', {'order_status': OrderStatus.CONFIRMED.value}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._stock(self.product1), (1, True))
+
+    def _coupon(self):
+        self.order_data['coupon_code'] = 'CHECKOUT10'
+        return Coupon.objects.create(
+            code='CHECKOUT10', discount_percent=Decimal("10.00"),
+            max_discount_amount=Decimal("100.00"), usage_limit=2,
+        )
+
+    def test_checkout_redeems_coupon(self):
+        """A coupon order counts one use of the coupon"""
+        coupon = self._coupon()
+        response = self._checkout((self.product1, 1))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['final_amount']), Decimal("90.00"))
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.times_used, 1)
+
+    def test_coupon_used_up_during_checkout_rolls_back(self):
+        """A coupon spent by a concurrent order fails this one and keeps its cart and stock"""
+        self._coupon()
+        with mock.patch.object(Coupon, 'redeem', return_value=False):
+            response = self._checkout((self.product1, 1))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('coupon_code', response.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self._stock(self.product1), (3, True))
+        self.assertEqual(Cart.objects.get(user=self.user).items.count(), 1)
+
+
+@override_settings(STOCK_RESERVATION_ENABLED=True)
+class OrderIdempotencyTest(CheckoutTestMixin, TestCase):
+    """Retried order requests with an Idempotency-Key replay the first order"""
+
+    def _post(self, key, data=None):
+        return self.client.post(
+            '/api/orders/', data or self.order_data, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_order(self):
+        """A retry returns the first order without reserving stock again"""
+        self._add_to_cart((self.product1, 2))
+        first = self._post('retry-1')
+        self._add_to_cart((self.product2, 1))
+        retry = self._post('retry-1')
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self._stock(self.product1), (1, True))
+        self.assertEqual(self._stock(self.product2), (5, True))
+        self.assertEqual(Cart.objects.get(user=self.user).items.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        self._add_to_cart((self.product1, 1))
+        self.assertEqual(self._post('reused').status_code, 201)
+
+        response = self._post('reused', {**self.order_data, 'customer_name': 'Someone Else'})
+
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_checkout_keeps_no_key(self):
+        """A retry after a failed checkout places the order"""
+        self._add_to_cart((self.product1, 4))
+        self.assertEqual(self._post('after-failure').status_code, 400)
+        self.assertFalse(OrderIdempotencyKey.objects.exists())
+
+        Product.objects.filter(pk=self.product1.pk).update(stock_quantity=4)
+        response = self._post('after-failure')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    @override_settings(ORDER_IDEMPOTENCY_TTL=60)
+    def test_expired_key_places_new_order(self):
+        self._add_to_cart((self.product1, 1))
+        first = self._post('expiring')
+        OrderIdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        self._add_to_cart((self.product1, 1))
+
+        retry = self._post('expiring')
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(purge_idempotency_keys(), 0)
+        OrderIdempotencyKey.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(purge_idempotency_keys(), 1)
+
+    def test_key_too_long(self):
+        self.assertEqual(self._post('k' * 256).status_code, 400)
+
+
+@override_settings(STOCK_RESERVATION_ENABLED=True)
+class OrderIdempotencyConcurrencyTest(TransactionTestCase):
+    """Duplicates sent while the first request runs wait for it and replay its order"""
+
+    def _post(self, token, barrier, responses):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            barrier.wait()
+            responses.append(client.post('/api/orders/', {
+                'customer_name': 'Parallel Customer',
+                'customer_phone': '1234567890',
+                'customer_address': 'Parallel Address',
+                'payment_method': PaymentMethod.COD.value,
+            }, format='json', HTTP_IDEMPOTENCY_KEY='parallel'))
+        finally:
+            connection.close()
+
+    def test_parallel_duplicates_place_one_order(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        user = User.objects.create_user(email="parallel@example.com", password="testpass123")
+        product = Product.objects.create(
+            name="Parallel Product", price=Decimal("10.00"),
+            category=Category.objects.create(name="Parallel"), stock_quantity=10,
+        )
+        CartService.apply(user, [{"op": CartOperation.ADD.value, "product_id": product.id, "quantity": 2}])
+        token = str(RefreshToken.for_user(user).access_token)
+
+        responses = []
+        barrier = threading.Barrier(4)
+        threads = [
+            threading.Thread(target=self._post, args=(token, barrier, responses))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(len({response.data['id'] for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 8)
+
+
+@override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+class OrderListQueryTest(TestCase):
+    """Order history and admin order pages cost the same queries for any number of orders"""
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        self.user = User.objects.create_user(email="history@example.com", password="testpass123")
+        admin = User.objects.create_superuser(email="history-admin@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.admin_client = APIClient()
+        self.admin_client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        category = Category.objects.create(name="History Category")
+        self.products = [
+            Product.objects.create(
+                name=f"History {i}", price=Decimal("10.00"), category=category, image_urls=[f"https://img/{i}.jpg"],
+            )
+            for i in range(3)
+        ]
+        self.coupon = Coupon.objects.create(
+            code="HISTORY", discount_percent=Decimal("10.00"), max_discount_amount=Decimal("5.00"), usage_limit=None,
+        )
+
+    def _create_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                user=self.user, coupon=self.coupon, customer_name="History Customer",
+                customer_phone="1234567890", customer_address="History Address",
+                payment_method=PaymentMethod.COD.value, total_amount=Decimal("30.00"),
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price_at_order=product.price)
+                for product in self.products
+            ])
+
+    def _queries(self, client, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def _assert_constant_queries(self, client, url):
+        self._create_orders(1)
+        _response, single = self._queries(client, url)
+        self._create_orders(4)
+        response, many = self._queries(client, url)
+
+        self.assertEqual(single, many)
+        self.assertEqual(len(response.data['results']), 5)
+        item = response.data['results'][0]['items'][0]
+        self.assertEqual(item['product_name'], "History 0")
+        self.assertEqual(item['product_image_url'], "https://img/0.jpg")
+        self.assertEqual(response.data['results'][0]['coupon_code'], "HISTORY")
+        self.assertNotIn('coupon_info', response.data['results'][0])
+        self.assertEqual(set(item), {'product_name', 'product_image_url', 'quantity', 'price_at_order'})
+        self.assertEqual(response.data['results'][0]['user_email'], "history@example.com")
+
+    def test_order_history_is_constant_queries(self):
+        self._assert_constant_queries(self.client, '/api/orders/')
+
+    def test_admin_order_list_is_constant_queries(self):
+        self._assert_constant_queries(self.admin_client, '/api/admin/orders/')
+
+
+class CouponRedemptionConcurrencyTest(TransactionTestCase):
+    """A limited coupon is never overspent by parallel redemptions"""
+
+    def _redeem(self, barrier, results):
+        try:
+            coupon = Coupon.objects.get(code='PARALLEL')
+            barrier.wait()
+            with transaction.atomic():
+                results.append(coupon.redeem())
+        finally:
+            connection.close()
+
+    def test_parallel_redemptions_respect_usage_limit(self):
+        Coupon.objects.create(
+            code='PARALLEL', discount_percent=Decimal("10.00"),
+            max_discount_amount=Decimal("10.00"), usage_limit=5,
+        )
+        results = []
+        barrier = threading.Barrier(20)
+        threads = [
+            threading.Thread(target=self._redeem, args=(barrier, results))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(results.count(False), 15)
+        self.assertEqual(Coupon.objects.get(code='PARALLEL').times_used, 5)
+
+
+@override_settings(STOCK_RESERVATION_ENABLED=True)
+class StockReservationConcurrencyTest(TransactionTestCase):
+    """Concurrent reservations never oversell and never deadlock"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="concurrent-stock@example.com", password="testpass123")
+        category = Category.objects.create(name="Concurrent Stock")
+        self.products = [
+            Product.objects.create(name=f"Concurrent {i}", price=Decimal("1.00"), category=category, stock_quantity=5)
+            for i in range(3)
+        ]
+
+    def _reserve(self, lines, results):
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=self.user, customer_name="Concurrent", customer_phone="1234567890",
+                    customer_address="Concurrent", payment_method=PaymentMethod.COD.value,
+                    total_amount=Decimal("3.00"),
+                )
+                StockService.reserve(order, [
+                    OrderItem(product=product, quantity=quantity, price_at_order=product.price)
+                    for product, quantity in lines
+                ])
+            results.append(True)
+        except InsufficientStock:
+            results.append(False)
+        finally:
+            connection.close()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        results = []
+        threads = []
+        for i in range(12):
+            # Lines in different orders per order, over overlapping products.
+            lines = [(product, 1) for product in self.products]
+            if i % 2:
+                lines.reverse()
+            threads.append(threading.Thread(target=self._reserve, args=(lines, results)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(results.count(False), 7)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual((product.stock_quantity, product.is_in_stock), (0, False))
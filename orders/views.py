@@ -1,132 +1,185 @@
 # orders/views.py
 
-from decimal import Decimal
 from django.db import transaction
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import IsAdminUser
 from rest_framework.permissions import AllowAny
 from django.utils.translation import gettext as _
 
-from cart.models import Cart
-from cart.views import calculate_cart_total
+from cart.services.cart_service import CartService, CartVersionConflict
 from .models import Order, OrderItem, Coupon, FlashSale
-from .serializers import OrderSerializer, CouponApplySerializer, CouponSerializer, FlashSaleSerializer, FlashSaleListSerializer, ActiveFlashSaleSerializer, ProductInstantSerializer
-from core.constants import OrderStatus, CancelReason, RejectReason
+from .services.idempotency_service import OrderIdempotencyService
+from .services.pricing_service import CheckoutPricingService
+from .services.stock_service import InsufficientStock, StockService
+from .serializers import OrderSerializer, OrderListSerializer, CouponApplySerializer, CouponSerializer, FlashSaleSerializer, FlashSaleListSerializer, ActiveFlashSaleSerializer, ProductInstantSerializer
+from core.constants import FieldLengths, OrderStatus, CancelReason, RejectReason
 from django.utils import timezone
+from core.authentication import CachedUserJWTAuthentication
+from core.conditional import ConditionalGetMixin
+from products.conditional import active_flash_sale_state
 from products.models import Product
 
 
 class OrderListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = OrderSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by("-ordered_at")
+        return OrderSerializer.setup_eager_loading(
+            Order.objects.filter(user=self.request.user).order_by("-ordered_at")
+        )
+
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return OrderListSerializer
+        return OrderSerializer
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CartVersionConflict):
+            # The hot cart changed between pricing and clearing it.
+            return Response({
+                "status": "error",
+                "message": _("Cart changed during checkout, please review it and retry")
+            }, status=status.HTTP_409_CONFLICT)
+        if isinstance(exc, InsufficientStock):
+            # Raised inside the order transaction, so nothing was reserved.
+            return Response({
+                "status": "error",
+                "message": _("Some products in your cart are out of stock"),
+                "product_ids": exc.product_ids
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return super().handle_exception(exc)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        key = request.headers.get(OrderIdempotencyService.HEADER)
+        if key is not None and not 0 < len(key) <= FieldLengths.DEFAULT:
+            return Response({
+                "status": "error",
+                "message": _("Idempotency-Key must be 1 to 255 characters long")
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         with transaction.atomic():
-            cart, _ = Cart.objects.select_for_update().get_or_create(user=request.user)
-            total = Decimal('0.00')
-            order_items_data = []
-            
-            for cart_item in cart.items:
-                product_id = cart_item["product_id"]
-                quantity = cart_item["quantity"]
-                
-                # Lấy giá gốc
-                original_price = Decimal(cart_item["price"])
-                final_price = original_price
-                
-                # Kiểm tra xem sản phẩm có trong Flash Sale đang hoạt động không
-                now = timezone.now()
-                active_flash_sales = FlashSale.objects.filter(
-                    is_active=True,
-                    start_date__lte=now,
-                    end_date__gte=now,
-                    products__id=product_id
-                )
-                
-                # Nếu có Flash Sale, áp dụng giá giảm
-                if active_flash_sales.exists():
-                    flash_sale = active_flash_sales.first()
-                    final_price = flash_sale.calculate_sale_price(original_price)
-                
-                # Tính tổng cho sản phẩm này
-                total += final_price * quantity
-                
-                # Lưu thông tin cho OrderItem
-                order_items_data.append({
-                    'product_id': product_id,
-                    'quantity': quantity,
-                    'price_at_order': final_price
-                })
-            
-            # Apply coupon if provided
-            coupon_code = request.data.get('coupon_code')
-            discount_amount = 0
-            coupon = None
-            
-            if coupon_code:
-                coupon_serializer = CouponApplySerializer(data={
-                    'code': coupon_code,
-                    'total_amount': total
-                })
-                
-                if coupon_serializer.is_valid():
-                    coupon = coupon_serializer.validated_data['code']
-                    final_amount, discount_amount = coupon.apply_discount(total)
-                    
-                    # Update coupon usage
-                    coupon.times_used += 1
-                    coupon.save()
-                else:
-                    return Response(
-                        {'coupon_code': coupon_serializer.errors},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            else:
-                final_amount = total
-
-            order = serializer.save(
-                user=request.user,
-                customer_email=request.user.email if request.user.is_authenticated else request.data.get('customer_email'),
-                total_amount=total,
-                discount_amount=discount_amount,
-                final_amount=final_amount,
-                coupon=coupon
-            )
+            if key:
+                # A duplicate sent while the first request is still
+                # running waits here until that request's transaction ends.
+                request_hash = OrderIdempotencyService.request_hash(request.data)
+                record, previous = OrderIdempotencyService.claim(request.user, key, request_hash)
+                if previous is not None:
+                    return self._replay(previous, request_hash)
+
+            order, error = self._place_order(request, serializer)
+            if error is not None:
+                # Nothing of a failed checkout is kept, its key included,
+                # so a retry runs the checkout again.
+                transaction.set_rollback(True)
+                return error
+
+            if key:
+                OrderIdempotencyService.complete(record, order)
+
+        return self._created_response(order.pk)
+
+    def _created_response(self, order_id, headers=None):
+        # Reloaded with its items and their products in a fixed number of
+        # queries instead of one product query per line.
+        order = self.get_queryset().get(pk=order_id)
+        read_serializer = self.get_serializer(order)
+        headers = {**self.get_success_headers(read_serializer.data), **(headers or {})}
+        return Response(read_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-            order_items = [
-                OrderItem(
-                    order=order,
-                    product_id=data['product_id'],
-                    quantity=data['quantity'],
-                    price_at_order=data['price_at_order'],
+    def _replay(self, previous, request_hash):
+        """The response of the order an Idempotency-Key already placed"""
+        if previous.request_hash != request_hash:
+            return Response({
+                "status": "error",
+                "message": _("Idempotency-Key was already used for a different order")
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        return self._created_response(
+            previous.order_id, headers={OrderIdempotencyService.REPLAYED_HEADER: 'true'},
+        )
+
+    def _place_order(self, request, serializer):
+        """
+        Turn the user's cart into an order inside the caller's transaction.
+        Returns ``(order, None)``, or ``(None, response)`` for a checkout
+        the caller must roll back.
+        """
+        # Without a hot cart store the cart row stays locked, keeping
+        # cart mutations out until the order commits.
+        cart, cart_items = CartService.checkout_items(request.user)
+        # Prices for every line come from two set-based queries, so
+        # the time spent under the lock does not grow with the cart.
+        order_items, total, unavailable = CheckoutPricingService.price_lines(cart_items)
+        if unavailable:
+            return None, Response({
+                "status": "error",
+                "message": _("Some products in your cart are no longer available"),
+                "product_ids": unavailable
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # Apply coupon if provided
+        coupon_code = request.data.get('coupon_code')
+        discount_amount = 0
+        coupon = None
+
+        if coupon_code:
+            coupon_serializer = CouponApplySerializer(data={
+                'code': coupon_code,
+                'total_amount': total
+            })
+
+            if coupon_serializer.is_valid():
+                coupon = coupon_serializer.validated_data['code']
+                final_amount, discount_amount = coupon.apply_discount(total)
+            else:
+                return None, Response(
+                    {'coupon_code': coupon_serializer.errors},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-                for data in order_items_data
-            ]
+        else:
+            final_amount = total
+
+        order = serializer.save(
+            user=request.user,
+            customer_email=request.user.email if request.user.is_authenticated else request.data.get('customer_email'),
+            total_amount=total,
+            discount_amount=discount_amount,
+            final_amount=final_amount,
+            coupon=coupon
+        )
 
-            OrderItem.objects.bulk_create(order_items)
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        # One conditional UPDATE over every line; unavailable or
+        # oversold products abort the whole order.
+        StockService.reserve(order, order_items)
+
+        # Counted as late as possible, so the coupon row stays locked
+        # only briefly and concurrent orders with the code barely wait.
+        # Before the cart is cleared, which a hot store cannot undo.
+        if coupon is not None and not coupon.redeem():
+            return None, Response(
+                {'coupon_code': [_("Coupon is no longer valid")]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            cart.items = []
-            cart.save()
+        CartService.clear_after_checkout(cart, cart_items)
 
-        read_serializer = self.get_serializer(order)
-        headers = self.get_success_headers(read_serializer.data)
-        return Response(read_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        return order, None
 
 
 class CouponValidateAPIView(generics.GenericAPIView):
     """Validate coupon and calculate discount"""
     serializer_class = CouponApplySerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
@@ -154,7 +207,7 @@ class CouponValidateAPIView(generics.GenericAPIView):
 class AdminCouponListAPIView(generics.ListCreateAPIView):
     """Admin view to list and create coupons"""
     serializer_class = CouponSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = Coupon.objects.all().order_by('-created_at')
 
@@ -162,7 +215,7 @@ class AdminCouponListAPIView(generics.ListCreateAPIView):
 class AdminCouponDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     """Admin view to manage individual coupons"""
     serializer_class = CouponSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = Coupon.objects.all()
 
@@ -172,7 +225,7 @@ class OrderRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     GET / PUT / DELETE /api/orders/<pk>/
     """
     serializer_class       = OrderSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes     = [IsAuthenticated]
 
     def get_queryset(self):
@@ -257,15 +310,15 @@ class OrderRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
 
 class AdminOrderListAPIView(generics.ListAPIView):
     """Admin view to list all orders"""
-    serializer_class = OrderSerializer
-    authentication_classes = [JWTAuthentication]
+    serializer_class = OrderListSerializer
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
-    queryset = Order.objects.all().order_by("-ordered_at")
+    queryset = OrderSerializer.setup_eager_loading(Order.objects.all().order_by("-ordered_at"))
 
 class AdminOrderDetailAPIView(generics.RetrieveUpdateAPIView):
     """Admin view to retrieve/update order details"""
     serializer_class = OrderSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = Order.objects.all()
 
@@ -305,22 +358,25 @@ class AdminOrderDetailAPIView(generics.RetrieveUpdateAPIView):
 class AdminFlashSaleListCreateAPIView(generics.ListCreateAPIView):
     """Admin view to list and create flash sales"""
     serializer_class = FlashSaleSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = FlashSale.objects.all().order_by('-created_at')
 
 class AdminFlashSaleDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     """Admin view to manage individual flash sales"""
     serializer_class = FlashSaleSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedUserJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser]
     queryset = FlashSale.objects.all()
 
-class ActiveFlashSaleListAPIView(generics.ListAPIView):
+class ActiveFlashSaleListAPIView(ConditionalGetMixin, generics.ListAPIView):
     """Public view to get active flash sales"""
     serializer_class = ActiveFlashSaleSerializer
     permission_classes = [AllowAny]
 
+    def get_validators(self, request, *args, **kwargs):
+        return active_flash_sale_state(self.get_queryset())
+
     def get_queryset(self):
         now = timezone.now()
         return FlashSale.objects.filter(
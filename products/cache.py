@@ -0,0 +1,121 @@
+"""Read-through cache for catalog payloads of products app."""
+from __future__ import annotations
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+CATALOG_VERSION_KEY = 'catalog:version'
+PRODUCT_VERSION_KEY = 'catalog:product:{pk}:version'
+PRODUCT_LIST_VERSION_KEY = 'catalog:products:version'
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def _bump_now_and_on_commit(key):
+    """
+    Invalidate immediately and once more after the surrounding transaction
+    commits, so a reader that cached pre-commit data in between is evicted.
+    """
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def invalidate_catalog():
+    """Invalidate every cached catalog payload (categories, flash sales)."""
+    _bump_now_and_on_commit(CATALOG_VERSION_KEY)
+
+
+def invalidate_product(pk):
+    """Invalidate one product's payloads and the product list validators."""
+    _bump_now_and_on_commit(PRODUCT_VERSION_KEY.format(pk=pk))
+    _bump_now_and_on_commit(PRODUCT_LIST_VERSION_KEY)
+
+
+def catalog_version():
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def product_version(pk):
+    return _get_version(PRODUCT_VERSION_KEY.format(pk=pk))
+
+
+def product_list_version():
+    return _get_version(PRODUCT_LIST_VERSION_KEY)
+
+
+def category_list_key(url):
+    digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f'catalog:categories:{catalog_version()}:{digest}'
+
+
+def product_detail_key(pk):
+    return f'catalog:product:{pk}:{catalog_version()}:{product_version(pk)}'
+
+
+def validators_key(name, *versions):
+    return ':'.join(['catalog:validators', str(name), *(str(v) for v in versions)])
+
+
+def get_payload(key):
+    return cache.get(key)
+
+
+def set_payload(key, value, timeout=None):
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    if timeout > 0:
+        cache.set(key, value, timeout)
+
+
+def product_detail_timeout(pk):
+    """
+    Seconds until the product's flash-sale pricing can change on its own,
+    capped by CATALOG_CACHE_TIMEOUT.
+    """
+    from orders.models import FlashSale
+
+    now = timezone.now()
+    boundaries = FlashSale.objects.filter(is_active=True, products=pk).aggregate(
+        next_start=Min('start_date', filter=Q(start_date__gt=now)),
+        next_end=Min('end_date', filter=Q(end_date__gte=now)),
+    )
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    for boundary in boundaries.values():
+        if boundary is not None:
+            timeout = min(timeout, int((boundary - now).total_seconds()) + 1)
+    return timeout
+
+
+def refresh_remaining_time(payload):
+    """Recompute the flash-sale countdown of a cached product payload."""
+    info = payload.get('flash_sale_info')
+    if not info:
+        return payload
+    end_date = info['end_date']
+    if isinstance(end_date, str):
+        end_date = parse_datetime(end_date)
+    remaining = (end_date - timezone.now()).total_seconds()
+    return {
+        **payload,
+        'flash_sale_info': {**info, 'remaining_time': max(remaining, 0)},
+    }
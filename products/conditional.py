@@ -0,0 +1,164 @@
+"""
+Cheap HTTP validators for catalog endpoints of products app.
+
+Validators come from database aggregates and are cached under the
+catalog cache versions that the signals bump, so revalidating an
+unchanged resource normally costs no query. The tags are built from the
+aggregated values only, never from the version counters, so every
+worker derives the same ETag even when the counters live in
+per-process memory.
+"""
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import Q
+from django.utils import timezone
+
+from core.conditional import latest
+from orders.models import FlashSale
+from products import cache as catalog_cache
+from products.models import Category
+from products.models import Product
+
+
+def _cached(key, compute):
+    """
+    Validators of ``compute(now)`` cached under ``key``.
+
+    ``compute`` returns ``(validators, changes_at)``. ``changes_at`` is
+    the next time the validators change without any write, when a flash
+    sale starts or ends, and caps the cache timeout.
+    """
+    cached = catalog_cache.get_payload(key)
+    if cached is not None:
+        return cached[0]
+
+    now = timezone.now()
+    validators, changes_at = compute(now)
+    timeout = settings.CATALOG_CACHE_TIMEOUT
+    if changes_at is not None:
+        timeout = min(timeout, int((changes_at - now).total_seconds()) + 1)
+    # Wrapped so a missing product (``None``) is cached too.
+    catalog_cache.set_payload(key, (validators,), timeout)
+    return validators
+
+
+def _flash_sale_state(now):
+    """
+    Validators for everything flash-sale pricing depends on, and when
+    they next change on their own.
+
+    Besides edits (``updated_at``, also touched on membership changes),
+    the live set changes when a sale starts or ends, so the ids of live
+    sales are part of the tag and the latest start/end that already
+    happened counts as a modification time.
+    """
+    live = Q(is_active=True, start_date__lte=now, end_date__gte=now)
+    state = FlashSale.objects.aggregate(
+        total=Count('id'),
+        updated=Max('updated_at'),
+        started=Max('start_date', filter=live),
+        ended=Max('end_date', filter=Q(is_active=True, end_date__lt=now)),
+        live_ids=ArrayAgg('id', filter=live, ordering='id'),
+        next_start=Min('start_date', filter=Q(is_active=True, start_date__gt=now)),
+        next_end=Min('end_date', filter=Q(is_active=True, end_date__gte=now)),
+    )
+    parts = (state['total'], state['updated'], state['live_ids'])
+    boundaries = [b for b in (state['next_start'], state['next_end']) if b is not None]
+    changes_at = min(boundaries) if boundaries else None
+    return parts, latest(state['updated'], state['started'], state['ended']), changes_at
+
+
+def _category_state():
+    state = Category.objects.aggregate(
+        total=Count('id'), updated=Max('updated_at'),
+    )
+    return (state['total'], state['updated']), state['updated']
+
+
+def category_state():
+    return _cached(
+        catalog_cache.validators_key('categories', catalog_cache.catalog_version()),
+        lambda now: (_category_state(), None),
+    )
+
+
+def product_list_state():
+    """
+    Validators for any product list, its categories and prices.
+
+    Counting the filtered list would cost as much as the page itself, so
+    the tag covers the whole table instead: the newest ``updated_at``
+    catches edits, soft deletes and stock changes, and the row count
+    catches hard deletes.
+    """
+    def compute(now):
+        products = Product.objects.aggregate(total=Count('id'), updated=Max('updated_at'))
+        category_parts, category_updated = _category_state()
+        sale_parts, sale_updated, changes_at = _flash_sale_state(now)
+        parts = (products['total'], products['updated'], *category_parts, *sale_parts)
+        return (parts, latest(products['updated'], category_updated, sale_updated)), changes_at
+
+    return _cached(
+        catalog_cache.validators_key(
+            'products', catalog_cache.catalog_version(), catalog_cache.product_list_version(),
+        ),
+        compute,
+    )
+
+
+def product_detail_state(pk):
+    """Validators for one product page, or ``None`` if it does not exist."""
+    def compute(now):
+        state = (
+            Product.objects
+            .filter(pk=pk, is_deleted=False)
+            .annotate(
+                reviews_total=Count('reviews'),
+                reviews_updated=Max('reviews__updated_at'),
+            )
+            .values(
+                'updated_at', 'category__updated_at',
+                'reviews_total', 'reviews_updated',
+            )
+            .first()
+        )
+        if state is None:
+            return None, None
+        sale_parts, sale_updated, changes_at = _flash_sale_state(now)
+        parts = (*state.values(), *sale_parts)
+        return (parts, latest(
+            state['updated_at'],
+            state['category__updated_at'],
+            state['reviews_updated'],
+            sale_updated,
+        )), changes_at
+
+    return _cached(
+        catalog_cache.validators_key(
+            f'product:{pk}', catalog_cache.catalog_version(), catalog_cache.product_version(pk),
+        ),
+        compute,
+    )
+
+
+def active_flash_sale_state(queryset):
+    """Validators for live flash sales and the products they list."""
+    def compute(now):
+        products = Product.objects.filter(flash_sales__in=queryset).aggregate(
+            updated=Max('updated_at'), category_updated=Max('category__updated_at'),
+        )
+        sale_parts, sale_updated, changes_at = _flash_sale_state(now)
+        parts = (*products.values(), *sale_parts)
+        return (parts, latest(*products.values(), sale_updated)), changes_at
+
+    return _cached(
+        catalog_cache.validators_key(
+            'active-flash-sales', catalog_cache.catalog_version(), catalog_cache.product_list_version(),
+        ),
+        compute,
+    )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.translation import gettext_lazy as _
+
+from products.models import Product
+from products.models import ProductReview
+from products.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = _('Rebuild stored rating aggregates of products from their reviews')
+
+    def handle(self, *args, **kwargs):
+        updated = rebuild_rating_stats(Product, ProductReview)
+        self.stdout.write(self.style.SUCCESS(
+            _('Rebuilt rating aggregates for %(count)s products') % {'count': updated}
+        ))
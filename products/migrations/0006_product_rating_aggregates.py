@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-16 09:12
+from __future__ import annotations
+
+from django.db import migrations, models
+
+from products.ratings import rebuild_rating_stats
+
+
+def backfill_rating_stats(apps, schema_editor):
+    rebuild_rating_stats(
+        apps.get_model('products', 'Product'),
+        apps.get_model('products', 'ProductReview'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_deleted_at_product_is_deleted_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Average review rating, kept in sync with reviews', max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of reviews'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, help_text='Sum of all review ratings'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='idx_products_rating'),
+        ),
+        migrations.RunPython(
+            backfill_rating_stats, migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 13:25
+from __future__ import annotations
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """
+    Install pg_trgm and a trigram index on product names when the server
+    ships the extension. Typo-tolerant search is skipped at runtime
+    otherwise, so databases without contrib modules still migrate.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+        )
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_products_name_trgm '
+        'ON products USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS idx_products_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-16 15:02
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['created_at', 'id'], name='idx_products_live_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['price', 'id'], name='idx_products_live_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['name', 'id'], name='idx_products_live_name'),
+        ),
+    ]
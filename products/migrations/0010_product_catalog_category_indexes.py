@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-16 16:18
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_catalog_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['category', 'created_at', 'id'], name='idx_products_live_cat_created'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['category', 'price', 'id'], name='idx_products_live_cat_price'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_in_stock', True)), fields=['category', 'name', 'id'], name='idx_products_live_cat_name'),
+        ),
+    ]
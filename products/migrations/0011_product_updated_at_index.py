@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 18:02
+from __future__ import annotations
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_catalog_category_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at'], name='idx_products_updated_at'),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import Avg
 
 from core.constants import DecimalSettings
 from core.constants import FieldLengths
@@ -47,6 +49,28 @@ class Product(BaseModel):
     stock_quantity = models.PositiveIntegerField(default=0)
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        help_text='Sum of all review ratings',
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of reviews',
+    )
+    rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        help_text='Average review rating, kept in sync with reviews',
+    )
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config='simple')
+            + SearchVector('description', weight='B', config='simple')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     def soft_delete(self):
         self.is_deleted = True
@@ -57,6 +81,46 @@ class Product(BaseModel):
         db_table = 'products'
         indexes = [
             models.Index(fields=['category'], name='idx_products_category_id'),
+            models.Index(
+                fields=['-rating_avg', '-rating_count'],
+                name='idx_products_rating',
+            ),
+            GinIndex(fields=['search_vector'], name='idx_products_search_vector'),
+            # Catalog ETags read MAX(updated_at) over the whole table.
+            models.Index(fields=['updated_at'], name='idx_products_updated_at'),
+            # Public catalog: every query filters is_in_stock=True and
+            # is_deleted=False, optionally narrows by category and price,
+            # and orders by created_at, price or name (id breaks ties).
+            models.Index(
+                fields=['created_at', 'id'],
+                name='idx_products_live_created',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['price', 'id'],
+                name='idx_products_live_price',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['name', 'id'],
+                name='idx_products_live_name',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                name='idx_products_live_cat_created',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['category', 'price', 'id'],
+                name='idx_products_live_cat_price',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
+            models.Index(
+                fields=['category', 'name', 'id'],
+                name='idx_products_live_cat_name',
+                condition=models.Q(is_in_stock=True, is_deleted=False),
+            ),
         ]
 
     def __str__(self):
@@ -79,12 +143,13 @@ class Product(BaseModel):
 
     @property
     def average_rating(self):
-        avg = self.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
-        return round(avg, 1) if avg else 0.0
+        if not self.rating_count:
+            return 0.0
+        return round(self.rating_sum / self.rating_count, 1)
 
     @property
     def total_reviews(self):
-        return self.reviews.count()
+        return self.rating_count
 
 
 class ProductReview(BaseModel):
@@ -0,0 +1,64 @@
+"""Flash-sale price resolution for products app."""
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.utils import timezone
+
+from orders.models import FlashSale
+
+
+class FlashSalePriceResolver:
+    """
+    Resolve the best active flash sale for a batch of products.
+
+    All products passed to ``load`` are resolved with a single query, and
+    the result is memoized so every price field of every product on a page
+    reads from the same lookup.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self._flash_sales = {}
+
+    def load(self, products):
+        product_ids = {
+            product.pk for product in products
+            if product.pk not in self._flash_sales
+        }
+        if not product_ids:
+            return
+
+        rows = (
+            FlashSale.products.through.objects
+            .filter(
+                product_id__in=product_ids,
+                flashsale__is_active=True,
+                flashsale__start_date__lte=self.now,
+                flashsale__end_date__gte=self.now,
+            )
+            .select_related('flashsale')
+            .order_by('product_id', '-flashsale__discount_percent')
+            .distinct('product_id')
+        )
+
+        self._flash_sales.update(dict.fromkeys(product_ids))
+        for row in rows:
+            self._flash_sales[row.product_id] = row.flashsale
+
+    def get_flash_sale(self, product):
+        if product.pk not in self._flash_sales:
+            self.load([product])
+        return self._flash_sales[product.pk]
+
+    def get_sale_price(self, product):
+        fs = self.get_flash_sale(product)
+        if fs:
+            return fs.calculate_sale_price(product.price).quantize(Decimal('0.01'))
+        return None
+
+    def get_effective_price(self, product):
+        sale_price = self.get_sale_price(product)
+        if sale_price is not None:
+            return sale_price
+        return product.price.quantize(Decimal('0.01'))
@@ -0,0 +1,69 @@
+"""Denormalized rating aggregates for products app."""
+from __future__ import annotations
+
+from decimal import Decimal
+
+from django.db.models import Count
+from django.db.models import DecimalField
+from django.db.models import F
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models.functions import Cast
+from django.db.models.functions import Coalesce
+from django.db.models.functions import Now
+from django.db.models.functions import NullIf
+
+RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg')
+
+
+def _average_expression(rating_sum, rating_count):
+    return Coalesce(
+        Cast(rating_sum, DecimalField(max_digits=12, decimal_places=2))
+        / NullIf(rating_count, 0),
+        Decimal('0'),
+        output_field=DecimalField(max_digits=3, decimal_places=2),
+    )
+
+
+def apply_rating_delta(product_model, product_id, sum_delta, count_delta):
+    """
+    Shift the stored aggregates of one product in a single UPDATE.
+
+    The new values are computed from the current column values, so
+    concurrent review writes never overwrite each other. ``updated_at``
+    is touched too, since the product's public payload changed.
+    """
+    if not sum_delta and not count_delta:
+        return
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('rating_count') + count_delta
+    product_model.objects.filter(pk=product_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=_average_expression(new_sum, new_count),
+        updated_at=Now(),
+    )
+
+
+def rebuild_rating_stats(product_model, review_model, queryset=None):
+    """Recompute the stored aggregates from the review table."""
+    reviews = (
+        review_model.objects
+        .filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+    )
+    rating_sum = Coalesce(
+        Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0,
+    )
+    rating_count = Coalesce(
+        Subquery(reviews.annotate(total=Count('id')).values('total')), 0,
+    )
+    if queryset is None:
+        queryset = product_model.objects.all()
+    return queryset.update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        rating_avg=_average_expression(rating_sum, rating_count),
+    )
@@ -0,0 +1,118 @@
+"""Full-text and autocomplete search for products app."""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F
+
+from core.constants import SearchSettings
+
+_TERM_RE = re.compile(r'[^\W_]+')
+
+
+def normalize_query(q):
+    """Lower-case the input and keep only its word characters."""
+    return ' '.join(_TERM_RE.findall((q or '').lower()))
+
+
+def plain_search_query(q):
+    """Match whole lexemes, e.g. 'kettle' but not 'kett'."""
+    return SearchQuery(q, config='simple')
+
+
+def prefix_search_query(q):
+    """Match every term of the input as a lexeme prefix: 'iph 15' -> iph:* & 15:*."""
+    terms = normalize_query(q).split()
+    if not terms:
+        return None
+    return SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config='simple',
+    )
+
+
+def order_by_rank(queryset, query):
+    """Order an already matched queryset by relevance to ``query``."""
+    return (
+        queryset
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-id')
+    )
+
+
+def ranked_search(queryset, query):
+    """Filter on the GIN-indexed search vector and order by relevance."""
+    return order_by_rank(queryset.filter(search_vector=query), query)
+
+
+@lru_cache(maxsize=None)
+def trigram_search_available():
+    """Whether the pg_trgm extension (and its name index) is installed."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def typo_tolerant_search(queryset, q):
+    """Match product names by trigram word similarity, e.g. 'samsnug'."""
+    q = normalize_query(q)
+    return (
+        queryset
+        .filter(name__trigram_word_similar=q)
+        .annotate(similarity=TrigramWordSimilarity(q, 'name'))
+        .order_by('-similarity', '-id')
+    )
+
+
+class PrefixCache:
+    """
+    Small thread-safe LRU for hot autocomplete prefixes.
+
+    Entries expire after ``ttl`` seconds so every worker converges on
+    fresh data, and the cache is cleared whenever a product is saved in
+    this process.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+instant_search_cache = PrefixCache(
+    maxsize=SearchSettings.PREFIX_CACHE_SIZE,
+    ttl=SearchSettings.PREFIX_CACHE_TTL_SECONDS,
+)
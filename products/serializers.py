@@ -1,16 +1,14 @@
 from __future__ import annotations
 
-from decimal import Decimal
-
-from django.utils import timezone
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
 from core.constants import ReviewSettings
-from orders.models import FlashSale
 from products.models import Category
 from products.models import Product
 from products.models import ProductReview
+from products.pricing import FlashSalePriceResolver
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -68,7 +66,59 @@ class AdminProductSerializer(serializers.ModelSerializer):
         return value
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class FlashSalePricingListSerializer(serializers.ListSerializer):
+    """Resolve flash sales for the whole page before serializing rows."""
+
+    def to_representation(self, data):
+        iterable = data.all() if hasattr(data, 'all') else data
+        products = list(iterable)
+        self.child.get_price_resolver().load(products)
+        return super().to_representation(products)
+
+
+class FlashSalePricingMixin:
+    """
+    Sale-aware price fields backed by a shared FlashSalePriceResolver.
+
+    The resolver is stored in the serializer context so that every field
+    of every product serialized in the same request reuses one lookup.
+    """
+
+    def get_price_resolver(self):
+        resolver = self.context.get('price_resolver')
+        if resolver is None:
+            resolver = FlashSalePriceResolver()
+            self.context['price_resolver'] = resolver
+        return resolver
+
+    def _get_active_flash_sale(self, obj):
+        return self.get_price_resolver().get_flash_sale(obj)
+
+    def get_effective_price(self, obj):
+        return str(self.get_price_resolver().get_effective_price(obj))
+
+    def get_sale_price(self, obj):
+        sale_price = self.get_price_resolver().get_sale_price(obj)
+        return str(sale_price) if sale_price is not None else None
+
+    def get_discount_percent(self, obj):
+        fs = self._get_active_flash_sale(obj)
+        return float(fs.discount_percent) if fs else None
+
+    def get_flash_sale_info(self, obj):
+        fs = self._get_active_flash_sale(obj)
+        if not fs:
+            return None
+        remaining = fs.get_remaining_time()
+        return {
+            'id': fs.id,
+            'name': fs.name,
+            'end_date': fs.end_date,
+            'remaining_time': remaining.total_seconds() if remaining else 0,
+        }
+
+
+class ProductListSerializer(FlashSalePricingMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     first_image = serializers.SerializerMethodField()
     effective_price = serializers.SerializerMethodField()
@@ -97,53 +147,13 @@ class ProductListSerializer(serializers.ModelSerializer):
             'updated_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = FlashSalePricingListSerializer
 
     def get_first_image(self, obj):
         return obj.first_image_url
 
-    def _get_active_flash_sale(self, obj):
-        now = timezone.now()
-        return (
-            FlashSale.objects
-            .filter(
-                is_active=True,
-                start_date__lte=now,
-                end_date__gte=now,
-                products=obj,
-            )
-            .order_by('-discount_percent')
-            .first()
-        )
-
-    def get_effective_price(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if fs:
-            return str(fs.calculate_sale_price(obj.price).quantize(Decimal('0.01')))
-        return str(obj.price.quantize(Decimal('0.01')))
-
-    def get_sale_price(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if fs:
-            return str(fs.calculate_sale_price(obj.price).quantize(Decimal('0.01')))
-        return None
-
-    def get_discount_percent(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        return float(fs.discount_percent) if fs else None
 
-    def get_flash_sale_info(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if not fs:
-            return None
-        return {
-            'id': fs.id,
-            'name': fs.name,
-            'end_date': fs.end_date,
-            'remaining_time': fs.get_remaining_time().total_seconds() if fs.get_remaining_time() else 0,
-        }
-
-
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(FlashSalePricingMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     effective_price = serializers.SerializerMethodField()
     sale_price = serializers.SerializerMethodField()
@@ -176,52 +186,27 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
-    def _get_active_flash_sale(self, obj):
-        now = timezone.now()
-        return (
-            FlashSale.objects
-            .filter(
-                is_active=True,
-                start_date__lte=now,
-                end_date__gte=now,
-                products=obj,
-            )
-            .order_by('-discount_percent')
-            .first()
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load everything the detail payload needs in three queries: the
+        product with its category, the N most recent reviews with their
+        users (one windowed query), and the best active flash sale (by
+        the price resolver on first access). Ratings are stored columns.
+        """
+        recent_reviews = ProductReview.objects.select_related(
+            'user',
+        ).order_by('-created_at', '-id')[:ReviewSettings.N_MOST_RECENT_REVIEWS]
+        return queryset.select_related('category').prefetch_related(
+            Prefetch('reviews', queryset=recent_reviews, to_attr='recent_review_list'),
         )
 
-    def get_effective_price(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if fs:
-            return str(fs.calculate_sale_price(obj.price).quantize(Decimal('0.01')))
-        return str(obj.price.quantize(Decimal('0.01')))
-
-    def get_sale_price(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if fs:
-            return str(fs.calculate_sale_price(obj.price).quantize(Decimal('0.01')))
-        return None
-
-    def get_discount_percent(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        return float(fs.discount_percent) if fs else None
-
-    def get_flash_sale_info(self, obj):
-        fs = self._get_active_flash_sale(obj)
-        if not fs:
-            return None
-        remaining = fs.get_remaining_time()
-        return {
-            'id': fs.id,
-            'name': fs.name,
-            'end_date': fs.end_date,
-            'remaining_time': remaining.total_seconds() if remaining else 0,
-        }
-
     def get_recent_reviews(self, obj):
-        recent_reviews = obj.reviews.select_related(
-            'user',
-        ).order_by('-created_at')[:ReviewSettings.N_MOST_RECENT_REVIEWS]
+        recent_reviews = getattr(obj, 'recent_review_list', None)
+        if recent_reviews is None:
+            recent_reviews = obj.reviews.select_related(
+                'user',
+            ).order_by('-created_at', '-id')[:ReviewSettings.N_MOST_RECENT_REVIEWS]
         return ProductReviewListSerializer(recent_reviews, many=True).data
 
 
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from orders.models import FlashSale
+from products import cache as catalog_cache
+from products.models import Category
+from products.models import Product
+from products.models import ProductReview
+from products.ratings import RATING_FIELDS
+from products.ratings import apply_rating_delta
+from products.search import instant_search_cache
+
+
+def _refresh_cached_product(review):
+    """Keep an already loaded review.product in sync with the database."""
+    if not ProductReview.product.is_cached(review):
+        return
+    try:
+        review.product.refresh_from_db(fields=RATING_FIELDS)
+    except Product.DoesNotExist:
+        pass
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """Store the rating being replaced so post_save can apply a delta."""
+    instance._previous_rating = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_rating = (
+        ProductReview.objects
+        .filter(pk=instance.pk)
+        .values_list('product_id', 'rating')
+        .first()
+    )
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous_rating', None)
+    if created:
+        apply_rating_delta(Product, instance.product_id, instance.rating, 1)
+    elif previous:
+        old_product_id, old_rating = previous
+        if old_product_id != instance.product_id:
+            apply_rating_delta(Product, old_product_id, -old_rating, -1)
+            apply_rating_delta(Product, instance.product_id, instance.rating, 1)
+        else:
+            apply_rating_delta(
+                Product, instance.product_id, instance.rating - old_rating, 0,
+            )
+    instance._previous_rating = None
+    _refresh_cached_product(instance)
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_delta(Product, instance.product_id, -instance.rating, -1)
+    _refresh_cached_product(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def clear_instant_search_cache(sender, **kwargs):
+    instant_search_cache.clear()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_cached_product(sender, instance, **kwargs):
+    catalog_cache.invalidate_product(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_delete(sender, instance, **kwargs):
+    # A hard delete leaves no updated_at behind for list ETags to notice.
+    catalog_cache.invalidate_catalog()
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_cached_product_reviews(sender, instance, **kwargs):
+    catalog_cache.invalidate_product(instance.product_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=FlashSale)
+@receiver(post_delete, sender=FlashSale)
+@receiver(m2m_changed, sender=FlashSale.products.through)
+def invalidate_cached_catalog(sender, **kwargs):
+    catalog_cache.invalidate_catalog()
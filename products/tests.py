@@ -3,24 +3,35 @@ from __future__ import annotations
 
 import os
 from datetime import timedelta
+from io import StringIO
 from decimal import Decimal
 from decimal import ROUND_HALF_UP
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
 from orders.models import FlashSale
 from orders.models import Order
 from orders.models import OrderItem
+from products import cache as catalog_cache
 from products.models import Category
 from products.models import Product
 from products.models import ProductReview
+from products.search import trigram_search_available
+from products.serializers import ProductDetailSerializer
+from products.views import ProductListAPIView
 
 
 def _extract_results(data):
@@ -184,7 +195,7 @@ class ProductsViewsTests(TestCase):
         url = reverse('products:admin_product_detail', args=[self.p1.id])
         # OrderItem exists() -> False; Cart exists() -> True
         with patch('products.views.OrderItem.objects.filter') as mock_order_filter, patch(
-            'products.views.Cart.objects.filter',
+            'products.views.CartItem.objects.filter',
         ) as mock_cart_filter:
             mock_qs_order = MagicMock()
             mock_qs_order.exists.return_value = False
@@ -202,7 +213,7 @@ class ProductsViewsTests(TestCase):
         self.client.force_authenticate(self.admin)
         url = reverse('products:admin_product_detail', args=[self.p3.id])
         with patch('products.views.OrderItem.objects.filter') as mock_order_filter, patch(
-            'products.views.Cart.objects.filter',
+            'products.views.CartItem.objects.filter',
         ) as mock_cart_filter:
             mock_qs_order = MagicMock()
             mock_qs_order.exists.return_value = False
@@ -238,6 +249,21 @@ class ProductsViewsTests(TestCase):
         # Only Red Kettle (19.99) matches range; Blue is 29.99
         self.assertEqual(names, {'Red Kettle'})
 
+    def test_public_list_search_relevance_ordering(self):
+        # Name matches (weight A) rank above description matches (weight B)
+        teapot = Product.objects.create(
+            name='Teapot',
+            description='Pairs well with a kettle',
+            price=Decimal('12.00'),
+            category=self.cat_a,
+            is_in_stock=True,
+        )
+        url = reverse('products:api_product_list')
+        resp = self.client.get(url, {'search': 'kett', 'ordering': 'relevance'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = [p['id'] for p in _extract_results(resp.json())]
+        self.assertEqual(ids, [self.p1.id, teapot.id])
+
     def test_public_list_ordering(self):
         url = reverse('products:api_product_list')
         resp = self.client.get(url, {'ordering': 'price'})
@@ -269,6 +295,49 @@ class ProductsViewsTests(TestCase):
         self.assertEqual(resp_empty.status_code, status.HTTP_200_OK)
         self.assertEqual(resp_empty.json().get('results', []), [])
 
+    def test_instant_search_uses_stored_vector_after_bulk_update(self):
+        url = reverse('products:instant_product_search')
+        Product.objects.filter(pk=self.p1.pk).update(name='Crimson Teapot')
+
+        resp = self.client.get(url, {'q': 'teapot'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in resp.json().get('results', [])]
+        self.assertEqual(ids, [self.p1.id])
+
+        resp_old = self.client.get(url, {'q': 'red'})
+        ids_old = [r['id'] for r in resp_old.json().get('results', [])]
+        self.assertNotIn(self.p1.id, ids_old)
+
+    def test_instant_search_matches_partial_words(self):
+        url = reverse('products:instant_product_search')
+        resp = self.client.get(url, {'q': 'ket'})
+        ids = [r['id'] for r in resp.json().get('results', [])]
+        self.assertEqual(ids, [self.p1.id])  # p2 is out of stock
+
+        resp_plain = self.client.get(url, {'q': 'ket', 'mode': 'plain'})
+        self.assertEqual(resp_plain.json().get('results', []), [])
+
+    def test_instant_search_caches_hot_prefixes(self):
+        url = reverse('products:instant_product_search')
+        first = self.client.get(url, {'q': 'Red  Ket'})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'q': 'red ket'})
+        self.assertEqual(first.json(), second.json())
+
+        # Saving a product drops cached results
+        self.p1.name = 'Red Kettle Deluxe'
+        self.p1.save()
+        third = self.client.get(url, {'q': 'red ket'})
+        self.assertEqual(third.json()['results'][0]['name'], 'Red Kettle Deluxe')
+
+    def test_instant_search_tolerates_typos(self):
+        if not trigram_search_available():
+            self.skipTest('pg_trgm is not installed')
+        url = reverse('products:instant_product_search')
+        resp = self.client.get(url, {'q': 'kettel'})
+        ids = [r['id'] for r in resp.json().get('results', [])]
+        self.assertIn(self.p1.id, ids)
+
 
 class ProductsFlashSalePricingTests(ProductsViewsTests):
     """
@@ -405,6 +474,383 @@ class ProductsFlashSalePricingTests(ProductsViewsTests):
         self.assertEqual(data['sale_price'], expected_sale)
         self.assertEqual(data['discount_percent'], 25.0)
 
+    def test_list_resolves_flash_sales_in_one_query(self):
+        now = timezone.now()
+        fs = FlashSale.objects.create(
+            name='Page Sale',
+            discount_percent=Decimal('10.00'),
+            start_date=now - timedelta(hours=1),
+            end_date=now + timedelta(hours=1),
+            is_active=True,
+        )
+        for i in range(8):
+            product = Product.objects.create(
+                name=f'Bulk Product {i}',
+                price=Decimal('10.00'),
+                category=self.cat_a,
+                is_in_stock=True,
+            )
+            fs.products.add(product)
+
+        url = reverse('products:api_product_list')
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        flash_sale_queries = [
+            q for q in ctx.captured_queries
+            if 'flash_sales_products' in q['sql']
+        ]
+        self.assertEqual(len(flash_sale_queries), 1)
+
+        results = _extract_results(resp.json())
+        discounted = [r for r in results if r['discount_percent'] == 10.0]
+        self.assertEqual(len(discounted), 8)
+        self.assertTrue(all(r['sale_price'] == '9.00' for r in discounted))
+
+class ProductCursorPaginationTests(TestCase):
+    """Keyset pagination mode of the public product list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Phones')
+        # Prices repeat so the id tiebreak is exercised
+        self.products = [
+            Product.objects.create(
+                name=f'Phone {i:02d}',
+                price=Decimal('100.00') + (i % 3),
+                category=self.category,
+                is_in_stock=True,
+            )
+            for i in range(30)
+        ]
+        self.url = reverse('products:api_product_list')
+
+    def _walk(self, params):
+        ids, pages = [], 0
+        resp = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            data = resp.json()
+            ids.extend(p['id'] for p in data['results'])
+            pages += 1
+            if not data['next']:
+                return ids, pages, data
+            resp = self.client.get(data['next'])
+
+    def test_cursor_walk_is_complete_and_stable(self):
+        for ordering in ['price', '-price', 'name', '-created_at']:
+            ids, pages, _ = self._walk({
+                'pagination': 'cursor', 'ordering': ordering, 'page_size': 7,
+            })
+            self.assertEqual(pages, 5)
+            self.assertEqual(len(ids), 30)
+            self.assertEqual(len(set(ids)), 30)
+
+        expected = [
+            p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))
+        ]
+        ids, _, _ = self._walk({'pagination': 'cursor', 'ordering': 'price'})
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        params = {'pagination': 'cursor', 'ordering': 'price', 'page_size': 5}
+        first = self.client.get(self.url, params).json()
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(
+            [p['id'] for p in back['results']],
+            [p['id'] for p in first['results']],
+        )
+
+    def test_count_is_optional_and_deep_pages_skip_offset(self):
+        data = self.client.get(self.url, {'pagination': 'cursor'}).json()
+        self.assertNotIn('count', data)
+
+        counted = self.client.get(
+            self.url, {'pagination': 'cursor', 'include_count': 'true'},
+        ).json()
+        self.assertEqual(counted['count'], 30)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(counted['next'])
+        product_sql = [
+            q['sql'] for q in ctx.captured_queries if 'FROM "products"' in q['sql']
+        ]
+        self.assertTrue(product_sql)
+        for sql in product_sql:
+            self.assertNotIn('OFFSET', sql)
+            self.assertNotIn('COUNT(', sql)
+
+    def test_invalid_cursor_returns_404(self):
+        resp = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductCatalogCacheTests(TestCase):
+    """Cached category list and product detail payloads."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='reviewer@example.com', password='testpass123',
+        )
+        self.category = Category.objects.create(name='Audio')
+        self.product = Product.objects.create(
+            name='Headphones',
+            price=Decimal('50.00'),
+            category=self.category,
+            is_in_stock=True,
+        )
+        self.detail_url = reverse(
+            'products:api_product_detail', args=[self.product.id],
+        )
+        self.category_url = reverse('products:api_category_list')
+
+    def test_product_detail_served_from_cache(self):
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        # The ETag validators are cached alongside the payload.
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail_url)
+        self.assertEqual(first.json(), second.json())
+
+    def test_product_detail_invalidated_by_writes(self):
+        self.client.get(self.detail_url)
+
+        self.product.name = 'Wireless Headphones'
+        self.product.save()
+        self.assertEqual(
+            self.client.get(self.detail_url).json()['name'], 'Wireless Headphones',
+        )
+
+        ProductReview.objects.create(user=self.user, product=self.product, rating=4)
+        self.assertEqual(self.client.get(self.detail_url).json()['total_reviews'], 1)
+
+        now = timezone.now()
+        sale = FlashSale.objects.create(
+            name='Audio Week',
+            discount_percent=Decimal('10.00'),
+            start_date=now - timedelta(hours=1),
+            end_date=now + timedelta(hours=1),
+        )
+        sale.products.add(self.product)
+        data = self.client.get(self.detail_url).json()
+        self.assertEqual(data['sale_price'], '45.00')
+        self.assertGreater(data['flash_sale_info']['remaining_time'], 0)
+
+        self.category.name = 'Hi-Fi'
+        self.category.save()
+        data = self.client.get(self.detail_url).json()
+        self.assertEqual(data['category']['name'], 'Hi-Fi')
+
+    def test_category_list_served_from_cache(self):
+        self.client.get(self.category_url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.category_url)
+        self.assertEqual(
+            [c['name'] for c in _extract_results(cached.json())], ['Audio'],
+        )
+
+        Category.objects.create(name='Cameras')
+        fresh = self.client.get(self.category_url)
+        self.assertEqual(
+            [c['name'] for c in _extract_results(fresh.json())],
+            ['Audio', 'Cameras'],
+        )
+
+
+class CatalogConditionalRequestTests(TestCase):
+    """ETag / Last-Modified validation of the public catalog endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name='Audio')
+        self.product = Product.objects.create(
+            name='Speaker',
+            price=Decimal('80.00'),
+            category=self.category,
+            is_in_stock=True,
+        )
+        self.list_url = reverse('products:api_product_list')
+        self.detail_url = reverse(
+            'products:api_product_detail', args=[self.product.id],
+        )
+        self.category_url = reverse('products:api_category_list')
+
+    def _revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_resources_answer_304(self):
+        for url in (self.list_url, self.detail_url, self.category_url):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, status.HTTP_200_OK)
+                self.assertIn('no-cache', first['Cache-Control'])
+                self.assertIn('Last-Modified', first)
+                second = self._revalidate(url, first['ETag'])
+                self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(second['ETag'], first['ETag'])
+                self.assertEqual(second.content, b'')
+
+    def test_304_skips_the_serializer(self):
+        etag = self.client.get(self.list_url)['ETag']
+        # The validators were cached by the first request.
+        with self.assertNumQueries(0):
+            response = self._revalidate(self.list_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_tags_do_not_depend_on_cache_versions(self):
+        """A worker with its own cache computes the same tags from the database"""
+        tags = {
+            url: self.client.get(url)['ETag']
+            for url in (self.list_url, self.detail_url, self.category_url)
+        }
+        cache.clear()
+        catalog_cache.invalidate_catalog()
+        for url, etag in tags.items():
+            with self.subTest(url=url):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_hard_delete_changes_list_tag(self):
+        other = Product.objects.create(
+            name='Old Speaker', price=Decimal('10.00'), category=self.category,
+        )
+        Product.objects.filter(pk=other.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        etag = self.client.get(self.list_url)['ETag']
+        other.delete()
+        response = self._revalidate(self.list_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        first = self.client.get(self.detail_url)
+        response = self.client.get(
+            self.detail_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_query_string_is_part_of_the_tag(self):
+        first = self.client.get(self.list_url)
+        other = self._revalidate(f'{self.list_url}?ordering=price', first['ETag'])
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+
+    def test_writes_change_the_tags(self):
+        tags = {
+            url: self.client.get(url)['ETag']
+            for url in (self.list_url, self.detail_url)
+        }
+        now = timezone.now()
+        sale = FlashSale.objects.create(
+            name='Speaker Days',
+            discount_percent=Decimal('25.00'),
+            start_date=now - timedelta(hours=1),
+            end_date=now + timedelta(hours=1),
+        )
+        for url, etag in tags.items():
+            with self.subTest(url=url, change='flash sale'):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                tags[url] = response['ETag']
+
+        sale.products.add(self.product)
+        for url, etag in tags.items():
+            with self.subTest(url=url, change='sale membership'):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                tags[url] = response['ETag']
+
+        user = get_user_model().objects.create_user(
+            email='listener@example.com', password='testpass123',
+        )
+        ProductReview.objects.create(user=user, product=self.product, rating=5)
+        for url, etag in tags.items():
+            with self.subTest(url=url, change='review'):
+                response = self._revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_category_rename_changes_tag(self):
+        etag = self.client.get(self.category_url)['ETag']
+        self.category.name = 'Hi-Fi'
+        self.category.save()
+        response = self._revalidate(self.category_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(_extract_results(response.json())[0]['name'], 'Hi-Fi')
+
+    def test_missing_product_is_not_validated(self):
+        url = reverse('products:api_product_detail', args=[self.product.id + 1000])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+
+class ProductCatalogQueryPlanTests(TestCase):
+    """The planner serves public catalog queries from the partial indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            [Category(name=f'Category {i}') for i in range(100)],
+        )
+        Product.objects.bulk_create([
+            Product(
+                name=f'Product {i:05d}',
+                price=Decimal(i % 500) + Decimal('0.99'),
+                category=categories[i % len(categories)],
+                is_in_stock=i % 10 != 0,
+                is_deleted=i % 25 == 0,
+            )
+            for i in range(10000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE products')
+        cls.category = categories[3]
+
+    def _plan(self, params):
+        view = ProductListAPIView()
+        view.request = Request(APIRequestFactory().get('/api/products/', params))
+        view.format_kwarg = None
+        page_size = api_settings.PAGE_SIZE
+        return view.get_queryset()[:page_size].explain()
+
+    def assertUsesIndex(self, params, index_name):
+        plan = self._plan(params)
+        self.assertIn(index_name, plan, plan)
+        # The 100-row categories join may be scanned; products must not be.
+        self.assertNotIn('Seq Scan on products', plan, plan)
+
+    def test_default_listing(self):
+        self.assertUsesIndex({}, 'idx_products_live_created')
+
+    def test_order_by_price_and_name(self):
+        self.assertUsesIndex({'ordering': 'price'}, 'idx_products_live_price')
+        self.assertUsesIndex({'ordering': '-price'}, 'idx_products_live_price')
+        self.assertUsesIndex({'ordering': 'name'}, 'idx_products_live_name')
+
+    def test_price_range(self):
+        self.assertUsesIndex(
+            {'min_price': '100', 'max_price': '120', 'ordering': 'price'},
+            'idx_products_live_price',
+        )
+
+    def test_category_listing(self):
+        category = str(self.category.id)
+        self.assertUsesIndex(
+            {'category': category}, 'idx_products_live_cat_created',
+        )
+        self.assertUsesIndex(
+            {'category': category, 'ordering': '-price', 'min_price': '50'},
+            'idx_products_live_cat_price',
+        )
+        self.assertUsesIndex(
+            {'category': category, 'ordering': 'name'},
+            'idx_products_live_cat_name',
+        )
+
+
 # ---------- Product Review Tests ----------
 
 
@@ -582,6 +1028,72 @@ class ProductAverageRatingTests(TestCase):
         # Should round to 1 decimal
         self.assertEqual(self.product.average_rating, 3.7)
 
+    def test_rating_aggregates_follow_review_updates_and_deletes(self):
+        """Editing or deleting a review shifts the stored aggregates."""
+        first = ProductReview.objects.create(
+            user=self.users[0], product=self.product, rating=5,
+        )
+        second = ProductReview.objects.create(
+            user=self.users[1], product=self.product, rating=3,
+        )
+
+        first.rating = 1
+        first.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 4)
+        self.assertEqual(self.product.average_rating, 2.0)
+
+        second.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_reviews, 1)
+        self.assertEqual(self.product.average_rating, 1.0)
+        self.assertEqual(self.product.rating_avg, Decimal('1.00'))
+
+    def test_rating_properties_do_not_query(self):
+        ProductReview.objects.create(
+            user=self.users[0], product=self.product, rating=4,
+        )
+        product = Product.objects.get(pk=self.product.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(product.average_rating, 4.0)
+            self.assertEqual(product.total_reviews, 1)
+
+    def test_rebuild_product_ratings_command(self):
+        for i, rating in enumerate([2, 5]):
+            ProductReview.objects.create(
+                user=self.users[i], product=self.product, rating=rating,
+            )
+        Product.objects.filter(pk=self.product.pk).update(
+            rating_sum=0, rating_count=0, rating_avg=0,
+        )
+
+        call_command('rebuild_product_ratings', stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, 7)
+        self.assertEqual(self.product.total_reviews, 2)
+        self.assertEqual(self.product.rating_avg, Decimal('3.50'))
+
+    def test_public_list_ordering_by_rating(self):
+        other = Product.objects.create(
+            name='Other Product',
+            price=Decimal('9.99'),
+            category=self.category,
+            is_in_stock=True,
+        )
+        ProductReview.objects.create(
+            user=self.users[0], product=self.product, rating=2,
+        )
+        ProductReview.objects.create(
+            user=self.users[1], product=other, rating=5,
+        )
+
+        url = reverse('products:api_product_list')
+        resp = APIClient().get(url, {'ordering': '-rating'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = [r['id'] for r in _extract_results(resp.json())]
+        self.assertEqual(ids, [other.id, self.product.id])
+
 
 class ProductReviewAPITests(TestCase):
     """Test the Product Review API endpoints."""
@@ -953,6 +1465,47 @@ class ProductSerializerWithReviewsTests(TestCase):
         self.assertEqual(data['total_reviews'], 9)
         self.assertEqual(len(data['recent_reviews']), 5)  # Limited to 5
 
+    def test_product_detail_query_count_is_fixed(self):
+        """Detail payload costs the same number of queries for any review count."""
+        User = get_user_model()
+        for i in range(7):
+            user = User.objects.create_user(
+                email=f"reviewer{i}@example.com",
+                password='testpass123',
+            )
+            ProductReview.objects.create(user=user, product=self.product, rating=3)
+        now = timezone.now()
+        sale = FlashSale.objects.create(
+            name='Review Sale',
+            discount_percent=Decimal('10.00'),
+            start_date=now - timedelta(hours=1),
+            end_date=now + timedelta(hours=1),
+        )
+        sale.products.add(self.product)
+        cache.clear()
+
+        queryset = ProductDetailSerializer.setup_eager_loading(Product.objects.all())
+        # Product + category, recent reviews + users, best flash sale.
+        with self.assertNumQueries(3):
+            product = queryset.get(pk=self.product.pk)
+            data = ProductDetailSerializer(product).data
+        self.assertEqual(len(data['recent_reviews']), 5)
+        self.assertEqual(data['sale_price'], '26.99')
+        self.assertEqual(data['total_reviews'], 9)
+
+        url = reverse('products:api_product_detail', args=[self.product.id])
+        # The same three, the two ETag validator aggregates and the
+        # flash-sale boundary lookup that sets the cache timeout. All of
+        # it is cached afterwards.
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        payload = response.json()
+        self.assertEqual(
+            [r['id'] for r in payload['recent_reviews']],
+            [r['id'] for r in data['recent_reviews']],
+        )
+        self.assertEqual(payload['sale_price'], '26.99')
+
 
 class ReviewSerializerTests(TestCase):
     """Test the review serializer behavior."""
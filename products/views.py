@@ -1,12 +1,6 @@
 """Views for products app."""
 from __future__ import annotations
 
-from django.contrib.postgres.search import (
-    SearchQuery,
-    SearchRank,
-    SearchVector
-)
-from django.db.models import Q
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
@@ -20,13 +14,28 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAdminUser
 
-from cart.models import Cart
+from cart.models import CartItem
+from core.conditional import ConditionalGetMixin
+from core.constants import SearchSettings
+from core.pagination import KeysetPagination
 from orders.models import OrderItem
+from products import cache as catalog_cache
+from products import conditional
 from products.models import (
     Category,
     Product,
     ProductReview
 )
+from products.search import (
+    instant_search_cache,
+    normalize_query,
+    order_by_rank,
+    plain_search_query,
+    prefix_search_query,
+    ranked_search,
+    trigram_search_available,
+    typo_tolerant_search
+)
 from products.serializers import (
     AdminProductSerializer,
     CategorySerializer,
@@ -38,10 +47,21 @@ from products.serializers import (
 )
 
 
-class CategoryListAPIView(generics.ListAPIView):
+class CategoryListAPIView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CategorySerializer
     queryset = Category.objects.all().order_by('name')
 
+    def get_validators(self, request, *args, **kwargs):
+        return conditional.category_state()
+
+    def list(self, request, *args, **kwargs):
+        key = catalog_cache.category_list_key(request.build_absolute_uri())
+        data = catalog_cache.get_payload(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            catalog_cache.set_payload(key, data)
+        return Response(data)
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class AdminProductListCreateView(generics.ListCreateAPIView):
@@ -103,7 +123,8 @@ class AdminProductDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_200_OK
             )
             
-        if Cart.objects.filter(items__contains=[{"product_id": instance.id}]).exists():
+        # Index probe on cart_items.product rather than a scan over carts
+        if CartItem.objects.filter(product=instance).exists():
             instance.soft_delete()
             return Response(
                 {
@@ -137,8 +158,30 @@ class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAdminUser]
 
 
-class ProductListAPIView(generics.ListAPIView):
+class ProductListAPIView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Public product catalog.
+
+    Paginated by page number by default. Pass ``pagination=cursor`` (or
+    follow a ``cursor`` link) for keyset pagination, which skips the
+    COUNT(*) unless ``include_count=true`` and keeps deep pages as cheap
+    as the first one.
+    """
     serializer_class = ProductListSerializer
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if 'cursor' in params or params.get('pagination') == 'cursor':
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_validators(self, request, *args, **kwargs):
+        return conditional.product_list_state()
 
     def get_queryset(self):
         queryset = Product.objects.select_related(
@@ -153,12 +196,11 @@ class ProductListAPIView(generics.ListAPIView):
             except (ValueError, TypeError):
                 pass
 
-        # Search by name or description
+        # Search by name or description through the search vector index
         search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search),
-            )
+        search_query = prefix_search_query(search) if search else None
+        if search_query is not None:
+            queryset = queryset.filter(search_vector=search_query)
 
         # Filter by price range
         min_price = self.request.query_params.get('min_price')
@@ -182,55 +224,110 @@ class ProductListAPIView(generics.ListAPIView):
             'name', '-name', 'price',
             '-price', 'created_at', '-created_at',
         ]
+        rating_orderings = {
+            'rating': ('rating_avg', 'rating_count'),
+            '-rating': ('-rating_avg', '-rating_count'),
+        }
         if ordering in valid_orderings:
             queryset = queryset.order_by(ordering)
+        elif ordering in rating_orderings:
+            queryset = queryset.order_by(*rating_orderings[ordering])
+        elif ordering == 'relevance' and search_query is not None:
+            queryset = order_by_rank(queryset, search_query)
         else:
             queryset = queryset.order_by('-created_at')
 
         return queryset
 
 
-class ProductDetailAPIView(generics.RetrieveAPIView):
+class ProductDetailAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Product.objects.select_related('category').all()
     serializer_class = ProductDetailSerializer
     lookup_field = 'pk'
 
     def get_queryset(self):
-        return Product.objects.select_related('category').filter(is_deleted=False)
+        return ProductDetailSerializer.setup_eager_loading(
+            Product.objects.filter(is_deleted=False),
+        )
+
+    def get_validators(self, request, *args, **kwargs):
+        return conditional.product_detail_state(kwargs[self.lookup_field])
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_field]
+        key = catalog_cache.product_detail_key(pk)
+        data = catalog_cache.get_payload(key)
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            catalog_cache.set_payload(
+                key, data, catalog_cache.product_detail_timeout(pk),
+            )
+        return Response(catalog_cache.refresh_remaining_time(data))
 
 
 class InstantProductSearchAPIView(generics.ListAPIView):
+    """
+    Typeahead search over in-stock products.
+
+    Query parameters:
+    - q: Search text
+    - limit: Maximum number of results (default 10, max 20)
+    - mode: 'prefix' (default) matches partial words and falls back to
+      trigram similarity for typos; 'plain' matches whole words only
+    """
     serializer_class = ProductInstantSerializer
     permission_classes = [permissions.AllowAny]
+    search_modes = {'prefix', 'plain'}
+
+    def get_mode(self):
+        mode = self.request.query_params.get('mode', 'prefix')
+        return mode if mode in self.search_modes else 'prefix'
 
     def get_queryset(self):
         q = (self.request.query_params.get('q') or '').strip()
         if not q:
             return Product.objects.none()
 
-        vector = (
-            SearchVector('name', weight='A', config='simple') +
-            SearchVector('description', weight='B', config='simple')
-        )
-        query = SearchQuery(q, config='simple')
+        if self.get_mode() == 'plain':
+            query = plain_search_query(q)
+        else:
+            query = prefix_search_query(q)
+            if query is None:
+                return Product.objects.none()
+
+        return ranked_search(self._base_queryset(), query)
 
+    def _base_queryset(self):
         return (
-            Product.objects.filter(is_in_stock=True, is_deleted=False)
-            .annotate(rank=SearchRank(vector, query))
-            .filter(rank__gt=0)
-            .order_by('-rank', '-id')
+            Product.objects
+            .filter(is_in_stock=True, is_deleted=False)
+            .only('id', 'name', 'price', 'image_urls', 'is_in_stock')
         )
 
     def list(self, request, *args, **kwargs):
 
         try:
-            limit = min(int(request.query_params.get('limit', 10)), 20)
+            limit = min(
+                int(request.query_params.get('limit', SearchSettings.INSTANT_DEFAULT_LIMIT)),
+                SearchSettings.INSTANT_MAX_LIMIT,
+            )
         except (TypeError, ValueError):
-            limit = 10
-
-        queryset = self.get_queryset()[:limit]
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({'results': serializer.data})
+            limit = SearchSettings.INSTANT_DEFAULT_LIMIT
+
+        q = normalize_query(request.query_params.get('q'))
+        mode = self.get_mode()
+        cache_key = (mode, q, limit)
+        data = instant_search_cache.get(cache_key)
+        if data is None:
+            products = list(self.get_queryset()[:limit])
+            if q and mode == 'prefix' and len(products) < limit and trigram_search_available():
+                products += list(
+                    typo_tolerant_search(self._base_queryset(), q)
+                    .exclude(pk__in=[p.pk for p in products])[:limit - len(products)]
+                )
+            data = self.get_serializer(products, many=True).data
+            instant_search_cache.set(cache_key, data)
+        return Response({'results': data})
 
 
 class ProductReviewListCreateAPIView(generics.ListCreateAPIView):